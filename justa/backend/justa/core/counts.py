@@ -0,0 +1,64 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max
+
+
+# below this number of rows Postgres' estimate is not worth it
+APPROXIMATE_COUNT_MINIMUM = 10000
+
+
+def version_key(model):
+    return f'justa:count-version:{model._meta.label_lower}'
+
+
+def invalidate_count(model):
+    """Call it after writes that do not send `post_save`/`post_delete`
+    signals and do not insert rows (inserts are noticed by `cached_count`),
+    such as `QuerySet.update` or raw SQL deletes"""
+    cache.set(version_key(model), uuid4().hex, None)
+
+
+def approximate_count(queryset):
+    """Postgres' estimate of the number of rows of unfiltered querysets"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+
+    if row and row[0] >= APPROXIMATE_COUNT_MINIMUM:
+        return row[0]
+
+
+def cached_count(queryset):
+    """Count of a queryset cached by model and SQL query (i.e. the filters)
+    until the model changes or `COUNT_CACHE_TIMEOUT` seconds pass. The bulk
+    inserts from the crawler do not send signals, so the latest ID of the
+    table (a cheap lookup in the primary key index) is part of the key too"""
+    if settings.APPROXIMATE_COUNT:
+        count = approximate_count(queryset)
+        if count is not None:
+            return count
+
+    model = queryset.model
+    version = cache.get_or_set(version_key(model), lambda: uuid4().hex, None)
+    latest = (
+        model._default_manager.using(queryset.db)
+        .aggregate(latest=Max('pk'))['latest']
+    )
+    query = md5(str(queryset.query).encode('utf-8')).hexdigest()
+    key = f'justa:count:{model._meta.label_lower}:{version}:{latest}:{query}'
+    return cache.get_or_set(
+        key,
+        queryset.count,
+        settings.COUNT_CACHE_TIMEOUT
+    )
@@ -0,0 +1,51 @@
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# rows fetched at a time from the database server-side cursor
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer returning what is written so `csv.writer` yields lines"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow(row)
+
+
+def ndjson_lines(queryset, fields):
+    for row in queryset.values(*fields).iterator(chunk_size=CHUNK_SIZE):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+FORMATS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
+
+
+def gzip_stream(lines):
+    """Compresses lines as a single gzip file, yielding only when the
+    compressor has output (i.e. chunks of compressed data, not every line)"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for line in lines:
+        data = compressor.compress(line.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(queryset, fields, file_format):
+    """Returns the gzip-compressed chunks of the queryset in the given format
+    (`csv` or `ndjson`)"""
+    return gzip_stream(FORMATS[file_format](queryset, fields))
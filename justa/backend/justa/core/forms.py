@@ -26,4 +26,6 @@ class AuthenticationForm(Form):
 class CourtOrderForm(ModelForm):
     class Meta:
         model = CourtOrder
-        fields = tuple(field.name for field in CourtOrder._meta.fields)
+        fields = tuple(
+            field.name for field in CourtOrder._meta.fields if field.editable
+        )
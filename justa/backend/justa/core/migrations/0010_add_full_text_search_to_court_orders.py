@@ -0,0 +1,130 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Postgres: a trigger keeps the `search_vector` column (Portuguese config)
+# updated, indexed with GIN
+
+POSTGRES_FORWARD = """
+CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {vector};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update();
+
+UPDATE {table} SET id = id;
+
+CREATE INDEX {table}_search_vector_idx ON {table} USING gin(search_vector);
+"""
+
+POSTGRES_BACKWARD = """
+DROP INDEX IF EXISTS {table}_search_vector_idx;
+DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};
+DROP FUNCTION IF EXISTS {table}_search_vector_update();
+"""
+
+POSTGRES_VECTORS = {
+    'core_courtorder': (
+        "to_tsvector('portuguese', coalesce(NEW.text, ''))"
+    ),
+    'core_courtorderesaj': (
+        "setweight(to_tsvector('portuguese', coalesce(NEW.subject, '')), 'A')"
+        " || "
+        "setweight(to_tsvector('portuguese', coalesce(NEW.decision, '')), 'B')"
+    ),
+}
+
+
+# SQLite (used locally and in tests): an external content FTS5 table kept
+# updated by triggers
+
+SQLITE_FORWARD = """
+CREATE VIRTUAL TABLE {table}_fts USING fts5(
+    {columns},
+    content='{table}',
+    content_rowid='id'
+);
+
+CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts(rowid, {columns}) VALUES (new.id, {new});
+END;
+
+CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts({table}_fts, rowid, {columns})
+    VALUES ('delete', old.id, {old});
+END;
+
+CREATE TRIGGER {table}_fts_update AFTER UPDATE ON {table} BEGIN
+    INSERT INTO {table}_fts({table}_fts, rowid, {columns})
+    VALUES ('delete', old.id, {old});
+    INSERT INTO {table}_fts(rowid, {columns}) VALUES (new.id, {new});
+END;
+
+INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild');
+"""
+
+SQLITE_BACKWARD = """
+DROP TRIGGER IF EXISTS {table}_fts_insert;
+DROP TRIGGER IF EXISTS {table}_fts_delete;
+DROP TRIGGER IF EXISTS {table}_fts_update;
+DROP TABLE IF EXISTS {table}_fts;
+"""
+
+SQLITE_COLUMNS = {
+    'core_courtorder': ('text',),
+    'core_courtorderesaj': ('subject', 'decision'),
+}
+
+
+def run(schema_editor, postgres, sqlite):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for table, vector in POSTGRES_VECTORS.items():
+            schema_editor.execute(postgres.format(table=table, vector=vector))
+
+    elif vendor == 'sqlite':
+        for table, columns in SQLITE_COLUMNS.items():
+            sql = sqlite.format(
+                table=table,
+                columns=', '.join(columns),
+                new=', '.join(f'new.{column}' for column in columns),
+                old=', '.join(f'old.{column}' for column in columns),
+            )
+            # SQLite executes a single statement at a time (statements are
+            # separated by blank lines in the templates above)
+            for statement in sql.strip().split('\n\n'):
+                schema_editor.execute(statement)
+
+
+def forward(apps, schema_editor):
+    run(schema_editor, POSTGRES_FORWARD, SQLITE_FORWARD)
+
+
+def backward(apps, schema_editor):
+    run(schema_editor, POSTGRES_BACKWARD, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_rename_court_order_tjsp_to_court_order_esaj'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courtorder',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='courtorderesaj',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(forward, backward),
+    ]
@@ -1,4 +1,9 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from justa.core.counts import invalidate_count
 
 
 class CourtOrder(models.Model):
@@ -8,6 +13,8 @@ class CourtOrder(models.Model):
     date = models.DateField()
     body = models.TextField(max_length=255, default='')
     text = models.TextField()
+    # maintained by a database trigger (see migration 0010)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ('-date', 'name')
@@ -35,6 +42,8 @@ class CourtOrderESAJ(models.Model):
     requested = models.TextField(default='')
     requested_attorneys = models.TextField(default='')
     appeals = models.TextField(default='')
+    # maintained by a database trigger (see migration 0010)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ('-decision_date',)
@@ -43,3 +52,11 @@ class CourtOrderESAJ(models.Model):
             models.Index(fields=['decision_date']),
             models.Index(fields=['number'])
         ]
+
+
+@receiver(post_save, sender=CourtOrder)
+@receiver(post_save, sender=CourtOrderESAJ)
+@receiver(post_delete, sender=CourtOrder)
+@receiver(post_delete, sender=CourtOrderESAJ)
+def invalidate_cached_counts(sender, **kwargs):
+    invalidate_count(sender)
@@ -0,0 +1,132 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from justa.core.counts import cached_count
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CachedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class CursorPage:
+
+    def __init__(self, object_list, next_cursor, previous_cursor, paginator):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.paginator = paginator
+
+
+class CursorPaginator:
+    """Keyset pagination: instead of counting and skipping rows with `OFFSET`,
+    each page is filtered by the ordering values of the last (or first) row of
+    the page before it, encoded in an opaque cursor. The ordering must be
+    unique (e.g. ending in the primary key)"""
+
+    NEXT, PREVIOUS = 'n', 'p'
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    @property
+    def count(self):
+        return cached_count(self.queryset)
+
+    def encode(self, obj, direction):
+        values = [getattr(obj, field) for field in self.fields]
+        data = json.dumps([direction, values], cls=DjangoJSONEncoder)
+        return urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode(self, cursor):
+        try:
+            data = urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            direction, values = json.loads(data)
+            valid = (
+                direction in (self.NEXT, self.PREVIOUS)
+                and isinstance(values, list)
+                and len(values) == len(self.fields)
+            )
+        except (DecodeError, TypeError, UnicodeError, ValueError):
+            raise InvalidCursor(cursor)
+
+        if not valid:
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def after(self, values, reverse=False):
+        """Filter for the rows coming after `values` in the ordering (or
+        before them, if `reverse`), as in: a > x OR (a = x AND b > y) OR…"""
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            equal = {
+                previous: value
+                for previous, value in zip(self.fields[:index], values)
+            }
+            equal[f'{name}__{lookup}'] = values[index]
+            conditions.append(Q(**equal))
+        return reduce(or_, conditions)
+
+    def page(self, cursor=None):
+        """Returns the first page if there is no cursor"""
+        direction, values = self.NEXT, None
+        if cursor:
+            direction, values = self.decode(cursor)
+
+        ordering = self.ordering
+        if direction == self.PREVIOUS:  # walk backwards and reverse later
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering
+            )
+
+        queryset = self.queryset.order_by(*ordering)
+        try:
+            if values is not None:
+                reverse = direction == self.PREVIOUS
+                queryset = queryset.filter(self.after(values, reverse=reverse))
+
+            # fetch one extra row to know whether there is another page
+            object_list = list(queryset[:self.per_page + 1])
+        except (TypeError, ValidationError, ValueError):
+            if values is None:
+                raise
+            # values of the wrong type for their fields
+            raise InvalidCursor(cursor)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if direction == self.PREVIOUS:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor, previous_cursor = None, None
+        if object_list and has_next:
+            next_cursor = self.encode(object_list[-1], self.NEXT)
+        if object_list and has_previous:
+            previous_cursor = self.encode(object_list[0], self.PREVIOUS)
+
+        return CursorPage(object_list, next_cursor, previous_cursor, self)
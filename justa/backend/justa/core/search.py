@@ -0,0 +1,105 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Func, TextField
+
+
+CONFIG = 'portuguese'
+
+# the last one is used for snippets in Postgres
+SEARCH_FIELDS = {
+    'core_courtorder': ('text',),
+    'core_courtorderesaj': ('subject', 'decision'),
+}
+
+
+class Headline(Func):
+    """Snippet of a text field with the search terms highlighted"""
+    function = 'ts_headline'
+    template = (
+        f"%(function)s('{CONFIG}', %(expressions)s, "
+        "'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=32')"
+    )
+    output_field = TextField()
+
+
+class PostgresSearchResults:
+    """Ranked results using the trigger-maintained `search_vector` column"""
+
+    def __init__(self, model, query):
+        search_query = SearchQuery(query, config=CONFIG)
+        text_field = SEARCH_FIELDS[model._meta.db_table][-1]
+        self.queryset = (
+            model.objects
+            .filter(search_vector=search_query)
+            .annotate(
+                rank=SearchRank(F('search_vector'), search_query),
+                snippet=Headline(F(text_field), search_query),
+            )
+            .order_by('-rank', 'id')
+        )
+
+    def count(self):
+        return self.queryset.count()
+
+    def __getitem__(self, key):
+        return self.queryset[key]
+
+
+class SQLiteSearchResults:
+    """Ranked results using the FTS5 table kept by triggers (it mimics the
+    Postgres results: all the words must match and higher ranks first)"""
+
+    def __init__(self, model, query):
+        self.model = model
+        self.table = f'{model._meta.db_table}_fts'
+        self.connection = connections[model.objects.db]
+        words = re.findall(r'\w+', query)
+        self.match = ' '.join(f'"{word}"' for word in words)
+
+    def execute(self, sql, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self):
+        if not self.match:
+            return 0
+
+        sql = f'SELECT count(*) FROM {self.table} WHERE {self.table} MATCH %s'
+        (count,), = self.execute(sql, [self.match])
+        return count
+
+    def __getitem__(self, key):
+        if not self.match:
+            return []
+
+        start = key.start or 0
+        sql = f"""
+            SELECT
+                rowid,
+                -bm25({self.table}),
+                snippet({self.table}, -1, '<mark>', '</mark>', '…', 32)
+            FROM {self.table}
+            WHERE {self.table} MATCH %s
+            ORDER BY bm25({self.table}), rowid
+            LIMIT %s OFFSET %s
+        """
+        rows = self.execute(sql, [self.match, key.stop - start, start])
+        objects = self.model.objects.in_bulk([pk for pk, *_ in rows])
+
+        hits = []
+        for pk, rank, snippet in rows:
+            hit = objects[pk]
+            hit.rank, hit.snippet = rank, snippet
+            hits.append(hit)
+        return hits
+
+
+def search(model, query):
+    """Returns an object that can be paginated by Django's `Paginator`, with
+    model instances containing the `rank` and `snippet` of each hit"""
+    if connections[model.objects.db].vendor == 'postgresql':
+        return PostgresSearchResults(model, query)
+    return SQLiteSearchResults(model, query)
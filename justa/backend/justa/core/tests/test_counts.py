@@ -0,0 +1,126 @@
+from datetime import date
+from importlib import import_module
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.shortcuts import resolve_url
+from mixer.backend.django import mixer
+
+from justa.core.counts import approximate_count, cached_count, invalidate_count
+from justa.core.models import CourtOrder, CourtOrderESAJ
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def count_queries(context):
+    """Queries counting rows (the cache itself is in the database too)"""
+    return [
+        query['sql'] for query in context.captured_queries
+        if 'COUNT(' in query['sql'] and 'justa_cache' not in query['sql']
+    ]
+
+
+@pytest.mark.django_db
+def test_cached_count():
+    mixer.cycle(3).blend(CourtOrderESAJ)
+    queryset = CourtOrderESAJ.objects.all()
+    with CaptureQueriesContext(connection) as context:
+        assert cached_count(queryset) == 3
+        assert cached_count(queryset) == 3
+    assert len(count_queries(context)) == 1
+
+
+@pytest.mark.django_db
+def test_cached_count_by_filter():
+    mixer.cycle(3).blend(CourtOrderESAJ, source='tjsp_full_text')
+    mixer.blend(CourtOrderESAJ, source='tjce_full_text')
+    queryset = CourtOrderESAJ.objects.all()
+    assert cached_count(queryset) == 4
+    assert cached_count(queryset.filter(source='tjce_full_text')) == 1
+
+
+@pytest.mark.django_db
+def test_cached_count_invalidated_on_save_and_delete():
+    mixer.cycle(3).blend(CourtOrder)
+    queryset = CourtOrder.objects.all()
+    assert cached_count(queryset) == 3
+    order = mixer.blend(CourtOrder)
+    assert cached_count(queryset) == 4
+    order.delete()
+    assert cached_count(queryset) == 3
+
+
+@pytest.mark.django_db
+def test_cached_count_sees_bulk_inserts():
+    """As the crawler does, without signals"""
+    queryset = CourtOrderESAJ.objects.all()
+    assert cached_count(queryset) == 0
+    CourtOrderESAJ.objects.bulk_create(
+        CourtOrderESAJ(
+            source='tjsp_full_text',
+            number=str(number),
+            decision='Here comes the full text',
+            decision_date=date(2018, 1, 1)
+        )
+        for number in range(2)
+    )
+    assert cached_count(queryset) == 2
+
+
+@pytest.mark.django_db
+def test_cached_count_invalidated_manually():
+    mixer.cycle(3).blend(CourtOrderESAJ)
+    queryset = CourtOrderESAJ.objects.all()
+    assert cached_count(queryset) == 3
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {CourtOrderESAJ._meta.db_table} WHERE id = %s',
+            [CourtOrderESAJ.objects.earliest('id').id]
+        )
+    assert cached_count(queryset) == 3
+    invalidate_count(CourtOrderESAJ)
+    assert cached_count(queryset) == 2
+
+
+@pytest.mark.django_db
+def test_approximate_count_only_in_postgres(settings):
+    settings.APPROXIMATE_COUNT = True
+    mixer.cycle(3).blend(CourtOrder)
+    assert approximate_count(CourtOrder.objects.all()) is None
+    assert cached_count(CourtOrder.objects.all()) == 3
+
+
+@pytest.mark.django_db
+def test_list_uses_cached_count(client):
+    mixer.cycle(3).blend(CourtOrderESAJ)
+    url = resolve_url('api:court_order_esaj_list')
+    assert client.get(url).json()['pagination']['count'] == 3
+    with CaptureQueriesContext(connection) as context:
+        assert client.get(url).json()['pagination']['count'] == 3
+    assert count_queries(context) == []
+
+
+@pytest.mark.django_db
+def test_cache_is_shared():
+    """The default cache is in the database, so other processes see it"""
+    assert isinstance(caches['default'], DatabaseCache)
+    cached_count(CourtOrder.objects.all())
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM justa_cache')
+        assert cursor.fetchone()[0] == 2  # model version and count
+
+
+@pytest.mark.django_db
+def test_cache_table_created_by_migration():
+    migration = import_module('justa.core.migrations.0011_create_cache_table')
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE justa_cache')
+    migration.create_cache_table(None, SimpleNamespace(connection=connection))
+    assert 'justa_cache' in connection.introspection.table_names()
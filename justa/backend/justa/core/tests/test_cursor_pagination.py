@@ -0,0 +1,102 @@
+import json
+from base64 import urlsafe_b64encode
+from datetime import date, timedelta
+
+import pytest
+from django.shortcuts import resolve_url
+from mixer.backend.django import mixer
+
+from justa.core.models import CourtOrder, CourtOrderESAJ
+
+
+def crawl(client, url, cursor=''):
+    """Follows the next cursors returning all the objects and the responses"""
+    objects, responses = [], []
+    while cursor is not None:
+        resp = client.get(url, {'cursor': cursor})
+        assert resp.status_code == 200
+        responses.append(resp.json())
+        objects.extend(responses[-1]['objects'])
+        cursor = responses[-1]['pagination']['next_cursor']
+    return objects, responses
+
+
+@pytest.mark.django_db
+def test_cursor_pagination(client):
+    dates = (date(2018, 1, 1) + timedelta(days=n % 7) for n in range(60))
+    mixer.cycle(60).blend(CourtOrderESAJ, decision_date=dates)
+    url = resolve_url('api:court_order_esaj_list')
+
+    objects, responses = crawl(client, url)
+    assert len(responses) == 3
+    assert len(objects) == 60
+    assert len({obj['id'] for obj in objects}) == 60
+
+    expected = CourtOrderESAJ.objects.order_by('-decision_date', 'id')
+    assert [obj['id'] for obj in objects] == [obj.id for obj in expected]
+
+    first, *_, last = responses
+    assert first['pagination']['previous_cursor'] is None
+    assert last['pagination']['next_cursor'] is None
+    assert 'count' not in first['pagination']
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_with_ties(client):
+    mixer.cycle(30).blend(CourtOrder, date=date(2018, 1, 1), name='John Doe')
+    url = resolve_url('api:court_order_list')
+    objects, _ = crawl(client, url)
+    assert len({obj['id'] for obj in objects}) == 30
+
+
+@pytest.mark.django_db
+def test_previous_cursor(client):
+    mixer.cycle(60).blend(CourtOrderESAJ)
+    url = resolve_url('api:court_order_esaj_list')
+    _, (first, second, third) = crawl(client, url)
+
+    cursor = third['pagination']['previous_cursor']
+    resp = client.get(url, {'cursor': cursor}).json()
+    assert resp['objects'] == second['objects']
+
+    cursor = resp['pagination']['previous_cursor']
+    resp = client.get(url, {'cursor': cursor}).json()
+    assert resp['objects'] == first['objects']
+    assert resp['pagination']['previous_cursor'] is None
+    assert resp['pagination']['next_cursor'] is not None
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_count(client):
+    mixer.cycle(3).blend(CourtOrderESAJ)
+    url = resolve_url('api:court_order_esaj_list')
+    resp = client.get(url, {'cursor': '', 'count': 'true'})
+    assert resp.json()['pagination']['count'] == 3
+
+
+@pytest.mark.django_db
+def test_invalid_cursor(client):
+    url = resolve_url('api:court_order_esaj_list')
+    resp = client.get(url, {'cursor': 'not a cursor'})
+    assert resp.status_code == 400
+
+
+def encode(data):
+    return urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('data', (
+    ['n', 5],
+    ['n', None],
+    ['x', ['2018-01-01', 1]],
+    ['n', ['2018-01-01']],
+    ['n', ['not a date', 1]],
+    ['n', ['2018-01-01', 'not an id']],
+    ['p', [[], {}]],
+))
+def test_cursor_with_invalid_values(client, data):
+    mixer.cycle(3).blend(CourtOrderESAJ)
+    url = resolve_url('api:court_order_esaj_list')
+    resp = client.get(url, {'cursor': encode(data)})
+    assert resp.status_code == 400
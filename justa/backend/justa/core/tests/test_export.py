@@ -0,0 +1,52 @@
+import csv
+import gzip
+import json
+from io import StringIO
+
+import pytest
+from django.shortcuts import resolve_url
+from mixer.backend.django import mixer
+
+from justa.core.models import CourtOrder, CourtOrderESAJ
+
+
+def download(resp):
+    assert resp.status_code == 200
+    assert resp.streaming
+    return gzip.decompress(b''.join(resp.streaming_content)).decode('utf-8')
+
+
+@pytest.mark.django_db
+def test_export_csv(client):
+    orders = mixer.cycle(3).blend(CourtOrder)
+    resp = client.get(resolve_url('api:court_order_export'))
+    assert resp['Content-Type'] == 'application/gzip'
+    assert 'core_courtorder.csv.gz' in resp['Content-Disposition']
+
+    rows = list(csv.DictReader(StringIO(download(resp))))
+    assert [row['number'] for row in rows] == [order.number for order in orders]
+    assert 'search_vector' not in rows[0]
+
+
+@pytest.mark.django_db
+def test_export_ndjson_filtered(client):
+    mixer.cycle(2).blend(CourtOrderESAJ, source='tjsp')
+    mixer.blend(CourtOrderESAJ, source='tjce')
+    url = resolve_url('api:court_order_esaj_export')
+    resp = client.get(url, {'format': 'ndjson', 'source': 'tjsp'})
+
+    rows = [json.loads(line) for line in download(resp).splitlines()]
+    assert len(rows) == 2
+    assert {row['source'] for row in rows} == {'tjsp'}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', (
+    {'format': 'xml'},
+    {'secret': 'x'},
+    {'id': 'abc'},
+    {'date': 'not a date'},
+))
+def test_export_invalid_params(client, params):
+    resp = client.get(resolve_url('api:court_order_export'), params)
+    assert resp.status_code == 400
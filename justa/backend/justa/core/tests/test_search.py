@@ -0,0 +1,51 @@
+import pytest
+from django.shortcuts import resolve_url
+from mixer.backend.django import mixer
+
+from justa.core.models import CourtOrder, CourtOrderESAJ
+
+
+@pytest.mark.django_db
+def test_search(client):
+    mixer.blend(CourtOrder, text='Habeas corpus concedido ao paciente')
+    mixer.blend(CourtOrder, text='Recurso negado, habeas corpus habeas corpus')
+    mixer.blend(CourtOrder, text='Apelação sem relação com a busca')
+    url = resolve_url('api:court_order_search')
+
+    resp = client.get(url, {'q': 'habeas corpus'})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data['pagination']['count'] == 2
+    assert len(data['objects']) == 2
+    assert data['objects'][0]['text'].startswith('Recurso negado')
+    assert data['objects'][0]['rank'] >= data['objects'][1]['rank']
+    assert '<mark>habeas</mark>' in data['objects'][0]['snippet'].lower()
+    assert 'search_vector' not in data['objects'][0]
+
+
+@pytest.mark.django_db
+def test_search_is_updated_with_the_court_orders(client):
+    order = mixer.blend(CourtOrderESAJ, subject='Roubo', decision='Negado')
+    url = resolve_url('api:court_order_esaj_search')
+    assert client.get(url, {'q': 'furto'}).json()['objects'] == []
+
+    order.subject = 'Furto'
+    order.save()
+    data = client.get(url, {'q': 'furto'}).json()
+    assert [obj['id'] for obj in data['objects']] == [order.pk]
+
+    order.delete()
+    assert client.get(url, {'q': 'furto'}).json()['objects'] == []
+
+
+@pytest.mark.django_db
+def test_search_without_query(client):
+    resp = client.get(resolve_url('api:court_order_search'), {'q': ' '})
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_list_hides_search_vector(client):
+    mixer.blend(CourtOrder)
+    resp = client.get(resolve_url('api:court_order_list'))
+    assert 'search_vector' not in resp.json()['objects'][0]
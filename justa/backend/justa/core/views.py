@@ -1,37 +1,93 @@
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.urls import re_path
 from restless.dj import DjangoResource
 from restless.exceptions import BadRequest
+from restless.constants import OK
 from restless.preparers import FieldsPreparer
 
+from justa.core.export import FORMATS, export
 from justa.core.models import CourtOrder, CourtOrderESAJ
 from justa.core.forms import AuthenticationForm, CourtOrderForm
+from justa.core.pagination import (
+    CachedCountPaginator,
+    CursorPaginator,
+    InvalidCursor
+)
+from justa.core.search import search
 
 
 class JustaResource(DjangoResource):
     page_size = 25
     model = None
+    hidden_fields = ('search_vector',)
+    http_methods = dict(
+        DjangoResource.http_methods,
+        search={'GET': 'search'},
+        export={'GET': 'export'}
+    )
+
+    @classmethod
+    def urls(cls, name_prefix=None):
+        custom_urls = [
+            re_path(
+                fr'^{endpoint}/$',
+                cls.as_view(endpoint),
+                name=cls.build_url_name(endpoint, name_prefix)
+            )
+            for endpoint in ('search', 'export')
+        ]
+        return custom_urls + super().urls(name_prefix=name_prefix)
+
+    @property
+    def field_names(self):
+        return tuple(
+            f.name
+            for f in self.model._meta.fields
+            if f.name not in self.hidden_fields
+        )
 
     @property
     def preparer(self):
         if not hasattr(self, '_preparer_cache'):
-            self._preparer_cache = FieldsPreparer(fields={
-                f.name: f.name
-                for f in self.model._meta.fields
-            })
+            fields = {name: name for name in self.field_names}
+            if self.endpoint == 'search':
+                fields.update(rank='rank', snippet='snippet')
+            self._preparer_cache = FieldsPreparer(fields=fields)
         return self._preparer_cache
 
     def is_authenticated(self):
-        if self.endpoint in {'list', 'detail'}:
+        if self.endpoint in {'list', 'detail', 'search', 'export'}:
             return True
 
         form = AuthenticationForm(self.request.POST)
         return form.is_valid()
 
+    @property
+    def ordering(self):
+        """Model's ordering with the primary key as a tiebreaker"""
+        return tuple(self.model._meta.ordering) + ('id',)
+
     def serialize_list(self, data):
         if data is None:
             return super(DjangoResource, self).serialize_list(data)
 
-        paginator = Paginator(data, self.page_size)
+        if 'cursor' in self.request.GET and self.endpoint != 'search':
+            paginator = CursorPaginator(data, self.page_size, self.ordering)
+            try:
+                self.cursor_page = paginator.page(self.request.GET['cursor'])
+            except InvalidCursor:
+                raise BadRequest('Invalid cursor')
+
+            data = self.cursor_page.object_list
+            return super(DjangoResource, self).serialize_list(data)
+
+        if self.endpoint == 'search':  # search results are not cached
+            paginator = Paginator(data, self.page_size)
+        else:
+            paginator = CachedCountPaginator(data, self.page_size)
+
         page_number = self.request.GET.get('page', 1)
         if page_number not in paginator.page_range:
             raise BadRequest('Invalid page number')
@@ -43,6 +99,17 @@ class JustaResource(DjangoResource):
     def wrap_list_response(self, data):
         response_dict = super(DjangoResource, self).wrap_list_response(data)
 
+        if hasattr(self, 'cursor_page'):
+            response_dict['pagination'] = {
+                'next_cursor': self.cursor_page.next_cursor,
+                'previous_cursor': self.cursor_page.previous_cursor,
+                'per_page': self.page_size,
+            }
+            if self.request.GET.get('count') == 'true':  # skipped by default
+                count = self.cursor_page.paginator.count
+                response_dict['pagination']['count'] = count
+            return response_dict
+
         if not hasattr(self, 'page'):
             return response_dict
 
@@ -64,9 +131,54 @@ class JustaResource(DjangoResource):
         }
         return response_dict
 
+    def serialize(self, method, endpoint, data):
+        if endpoint == 'search':
+            return self.serialize_list(data)
+        if endpoint == 'export':  # already serialized, and streamed
+            return data
+        return super().serialize(method, endpoint, data)
+
+    def build_response(self, data, status=OK):
+        if self.endpoint != 'export' or status != OK:
+            return super().build_response(data, status=status)
+
+        response = StreamingHttpResponse(data, content_type='application/gzip')
+        filename = f'{self.model._meta.db_table}.{self.export_format}.gz'
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
     def list(self):
         return self.model.objects.all()
 
+    def search(self):
+        """Full-text search ranked by relevance (no cursor pagination)"""
+        query = self.request.GET.get('q', '').strip()
+        if not query:
+            raise BadRequest('Missing search query (q)')
+
+        return search(self.model, query)
+
+    def export(self):
+        """Whole table (filtered by exact field values from the query string,
+        e.g. `?source=tjsp`) as gzip-compressed CSV or NDJSON (`?format=`)"""
+        filters = self.request.GET.dict()
+        self.export_format = filters.pop('format', 'csv')
+        if self.export_format not in FORMATS:
+            raise BadRequest(f'Invalid format: {self.export_format}')
+
+        unknown = set(filters) - set(self.field_names)
+        if unknown:
+            raise BadRequest(f'Invalid filters: {", ".join(sorted(unknown))}')
+
+        # the query is compiled (not executed) here, so invalid values are
+        # found before the response starts streaming
+        try:
+            queryset = self.model.objects.filter(**filters).order_by('id')
+            queryset.query.sql_with_params()
+        except (TypeError, ValidationError, ValueError):
+            raise BadRequest('Invalid filter values')
+        return export(queryset, self.field_names, self.export_format)
+
     def detail(self, pk):
         return self.model.objects.get(id=pk)
 
@@ -82,6 +82,30 @@ WSGI_APPLICATION = 'justa.wsgi.application'
 DATABASES = {'default': config('DATABASE_URL', cast=parse)}
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# Shared by all the web server processes, so a count invalidated by one of
+# them is invalidated for all (the table is created by a migration)
+
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': config('CACHE_LOCATION', default='justa_cache'),
+    }
+}
+
+
+# Counts for paginated lists
+# Cached for COUNT_CACHE_TIMEOUT seconds (or until the model changes in
+# Django); APPROXIMATE_COUNT uses Postgres' estimate for unfiltered lists
+
+COUNT_CACHE_TIMEOUT = config('COUNT_CACHE_TIMEOUT', default=300, cast=int)
+APPROXIMATE_COUNT = config('APPROXIMATE_COUNT', default=False, cast=bool)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
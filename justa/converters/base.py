@@ -25,8 +25,9 @@ class FileExtractor:
                 return child
         raise RuntimeError(f"There's no class registered for {institution}/{state}.")
 
-    def __init__(self, filename):
+    def __init__(self, filename, jobs=1):
         self.filename = filename
+        self.jobs = jobs  # processes used to extract the pages of PDF files
 
     @cached_property
     def metadata(self):
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""Benchmarks the registered extractors with the files of a corpus (by
+default the synthetic one created with `python benchmark.py generate`),
+reporting rows per second, peak memory and the time spent in each stage"""
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from openpyxl import Workbook
+
+import magistrados
+import utils
+from gender_classifier import NameClassifier
+from ore import FileExtractor
+
+
+BENCHMARKS_PATH = Path(__file__).parent / "benchmarks"
+FIXTURES_PATH = BENCHMARKS_PATH / "fixtures"
+BASELINE_FILENAME = BENCHMARKS_PATH / "baseline.json"
+DATA_TO_COPY_PATH = Path(__file__).parent / "data-to-copy"
+STAGES = ("open", "parse", "convert", "classify", "write")
+FIELD_NAMES = (
+    "ano",
+    "mes",
+    "instituicao",
+    "uf",
+    "cargo",
+    "nome",
+    "genero",
+    "rendimento_bruto",
+    "rendimento_liquido",
+    "observacao",
+)
+
+
+def fake_names(count, seed=42):
+    first_names = ("ANA", "MARIA", "JOSE", "JOAO", "PAULO", "FERNANDA", "LUCAS")
+    surnames = ("SILVA", "SOUZA", "OLIVEIRA", "SANTOS", "PEREIRA", "LIMA", "COSTA")
+    generator = random.Random(seed)
+    return [
+        f"{generator.choice(first_names)} {generator.choice(surnames)} "
+        f"{generator.choice(surnames)}"
+        for _ in range(count)
+    ]
+
+
+def fake_money(generator):
+    return f"{generator.randint(1000, 60000):,}".replace(",", ".") + (
+        f",{generator.randint(0, 99):02d}"
+    )
+
+
+def generate_dpe_pr(filename, count):
+    """Same layout of the DPE-PR spreadsheets: some lines before the header"""
+    generator = random.Random(count)
+    header = (
+        "Nomeação", "Nome", "Matrícula", "Cargo", "Função", "Lotação",
+        "Remuneração", "Total de Rendimentos Brutos", "Total de Descontos",
+        "Rendimento Líquido Total",
+    )
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Defensoria Pública do Estado do Paraná"])
+    sheet.append([])
+    sheet.append(header)
+    for index, name in enumerate(fake_names(count)):
+        sheet.append(
+            [
+                "2015-01-01", name, str(100000 + index), "Defensor Público",
+                "", "Curitiba", fake_money(generator), fake_money(generator),
+                fake_money(generator), fake_money(generator),
+            ]
+        )
+    workbook.save(filename)
+
+
+def generate_tje_sp(filename, count):
+    """Same layout of the TJE-SP CSV files (converted from RDS)"""
+    generator = random.Random(count)
+    with open(filename, mode="w", encoding="utf-8", newline="") as fobj:
+        writer = csv.writer(fobj, delimiter=";")
+        writer.writerow(("Cargo", "Nome", "Total de Créditos", "Rendimento Liquido"))
+        for name in fake_names(count):
+            writer.writerow(
+                ("Juiz de Direito", name, fake_money(generator), fake_money(generator))
+            )
+
+
+def generate_mpe_ce(filename, count):
+    """Same layout of the MPE-CE files: HTML (in ISO-8859-1) saved as `.ods`,
+    with the header lines marked with `bgcolor`"""
+    generator = random.Random(count)
+    lines = [
+        "<html><body><table>",
+        '<tr bgcolor="#cccccc"><td>Nome</td><td>Cargo</td><td>Lotação</td>'
+        + "<td>Valor</td>" * 12
+        + "</tr>",
+    ]
+    for name in fake_names(count):
+        money = "".join(f"<td>{fake_money(generator)}</td>" for _ in range(12))
+        lines.append(
+            f"<tr><td>{name}</td><td>Promotor de Justiça</td>"
+            f"<td>Fortaleza</td>{money}</tr>"
+        )
+    lines.append("</table></body></html>")
+    with open(filename, mode="w", encoding="iso-8859-1") as fobj:
+        fobj.write("\n".join(lines))
+
+
+def generate_tje_ce(filename, count):
+    """Same layout of the TJE-CE XLS files: the header is in the 4th line"""
+    import xlwt  # only needed to create the fixtures
+
+    generator = random.Random(count)
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet("Plan1")
+    sheet.write(0, 0, "Tribunal de Justiça do Estado do Ceará")
+    header = ("Nome", "Cargo no Órgão", "Total deCréditos (V)", "RendimentoLíquido (XI)")
+    for column, value in enumerate(header):
+        sheet.write(3, column, value)
+    for line, name in enumerate(fake_names(count), start=4):
+        values = (name, "Juiz de Direito", fake_money(generator), fake_money(generator))
+        for column, value in enumerate(values):
+            sheet.write(line, column, value)
+    workbook.save(str(filename))
+
+
+def generate(path, count):
+    """Creates the files that can be faithfully synthesized (XLSX, CSV, HTML
+    and XLS) and copies the public CSV samples from `data-to-copy`. The ODS
+    and PDF files must be copied from the real corpus"""
+    for directory in ("PR", "SP", "CE/TJE"):
+        (path / directory).mkdir(parents=True, exist_ok=True)
+    generate_dpe_pr(path / "PR" / "ORE-PR-DPE-1801-ativos.xlsx", count)
+    generate_tje_sp(path / "SP" / "ORE-SP-TJE-1601-ativos.csv", count)
+    generate_mpe_ce(path / "CE" / "ORE-CE-MPE-1801-ativos.ods", count)
+    generate_tje_ce(path / "CE" / "TJE" / "ORE-CE-TJE-1601-ativos.xls", count)
+    for filename in ("contracheque.csv.gz", "nomes.csv.gz"):
+        shutil.copy(DATA_TO_COPY_PATH / filename, path / filename)
+
+
+class Timer:
+    def __init__(self):
+        self.seconds = 0.0
+
+    def wrap(self, function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+
+        return wrapper
+
+
+def benchmark_file(args):
+    """Runs in a new process, so the peak memory (RSS) is of this file only"""
+    institution, state, filename, gender_filename = args
+    Extractor = FileExtractor.get_child(state=state, institution=institution)
+    timings = dict.fromkeys(STAGES, 0.0)
+    # Caches are built before the timers, so the results do not depend on
+    # their state
+    if "contracheque.csv" in filename.name:
+        magistrados.partition(filename)
+    classifier = NameClassifier(gender_filename)
+    classifier.load()
+    convert_timer = Timer()  # money conversion, made inside the extraction
+    utils.parse_money = convert_timer.wrap(utils.parse_money)
+    classify_timer = Timer()
+    classifier.classify_many = classify_timer.wrap(classifier.classify_many)
+    extract_timer = Timer()
+    next_row = extract_timer.wrap(next)
+
+    # Rows are streamed through the classification (in batches) and the
+    # writer, as in the CLI, so the peak memory is of the extractor
+    data = iter(Extractor(filename).data)
+    opened = {}  # extraction and conversion times until the first row
+    count = 0
+
+    def extracted_rows():
+        nonlocal count
+        row = next_row(data, None)
+        opened.update(seconds=extract_timer.seconds, converted=convert_timer.seconds)
+        while row is not None:
+            count += 1
+            yield row
+            row = next_row(data, None)
+
+    start = time.perf_counter()
+    with gzip.open(os.devnull, mode="wt", encoding="utf-8") as fobj:
+        writer = csv.DictWriter(fobj, fieldnames=FIELD_NAMES, extrasaction="ignore")
+        writer.writerows(classifier.classify_rows(extracted_rows()))
+    elapsed = time.perf_counter() - start
+
+    timings["open"] = opened["seconds"] - opened["converted"]
+    timings["convert"] = convert_timer.seconds
+    timings["parse"] = (
+        extract_timer.seconds - opened["seconds"]
+        - (convert_timer.seconds - opened["converted"])
+    )
+    timings["classify"] = classify_timer.seconds
+    timings["write"] = elapsed - extract_timer.seconds - classify_timer.seconds
+
+    total = sum(timings.values())
+    return {
+        "rows": count,
+        "rows_per_second": count / total if total else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "seconds": timings,
+    }
+
+
+def run(data_path, names=None):
+    gender_filename = data_path / "nomes.csv.gz"
+    NameClassifier(gender_filename).load()  # builds the index only once
+    results = {}
+    for Extractor in FileExtractor.registry():
+        patterns = Extractor.filename_pattern
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        filenames = sorted(
+            Path(filename)
+            for pattern in patterns
+            for filename in glob.glob(str(data_path / pattern))
+        )
+        for filename in filenames:
+            name = f"{Extractor.institution}-{Extractor.state}/{filename.name}"
+            if names and not any(value in name for value in names):
+                continue
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                args = (Extractor.institution, Extractor.state, filename, gender_filename)
+                results[name] = executor.submit(benchmark_file, args).result()
+    return results
+
+
+def report(results, baseline, tolerance):
+    """Prints the results and returns the names of the regressions: rows per
+    second below the baseline by more than `tolerance` (a fraction)"""
+    regressions = []
+    stages = " ".join(f"{stage:>8}" for stage in STAGES)
+    print(f"{'extractor/file':<50} {'rows':>7} {'rows/s':>9} {'RSS MB':>7} {stages}")
+    for name, result in results.items():
+        seconds = " ".join(f"{result['seconds'][stage]:8.3f}" for stage in STAGES)
+        line = (
+            f"{name:<50} {result['rows']:>7} {result['rows_per_second']:>9.0f} "
+            f"{result['peak_rss_mb']:>7.1f} {seconds}"
+        )
+        if name in baseline:
+            expected = baseline[name]["rows_per_second"]
+            change = result["rows_per_second"] / expected - 1 if expected else 0.0
+            line += f" ({change:+.0%} vs baseline)"
+            if change < -tolerance:
+                regressions.append(name)
+                line += " REGRESSION"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate")
+    generate_parser.add_argument("--data_path", default=FIXTURES_PATH)
+    generate_parser.add_argument("--rows", type=int, default=20_000)
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--data_path", default=FIXTURES_PATH)
+    run_parser.add_argument("--baseline", default=BASELINE_FILENAME)
+    run_parser.add_argument(
+        "--save-baseline", action="store_true", help="Save the results as baseline"
+    )
+    run_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Slowdown (fraction of the baseline rows/s) reported as regression",
+    )
+    run_parser.add_argument("names", nargs="*", help="Run only these (substrings)")
+    args = parser.parse_args()
+    data_path = Path(args.data_path)
+
+    if args.command == "generate":
+        generate(data_path, args.rows)
+        return
+
+    baseline_filename = Path(args.baseline)
+    baseline = {}
+    if baseline_filename.exists():
+        with open(baseline_filename) as fobj:
+            baseline = json.load(fobj)
+    results = run(data_path, args.names)
+    regressions = report(results, baseline, args.tolerance)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(baseline_filename, mode="w") as fobj:
+            json.dump(baseline, fobj, indent=2, sort_keys=True)
+    elif regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,56 @@
 #!/usr/bin/env python
 import argparse
-import csv
 import glob
+import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from rows.utils import open_compressed
 from tqdm import tqdm
 
 import settings
 from gender_classifier import NameClassifier
+from incremental import ConversionCache, write_chunk
 from ore import FileExtractor
+from parquet_output import ParquetWriter
+
+
+logger = logging.getLogger(__name__)
+# Set in each worker process by `init_worker`
+worker_classifier = None
+
+
+def extract_rows(Extractor, filename, gender_classifier, jobs=1, batch_size=10_000):
+    """Names are classified in batches of rows"""
+    extractor = Extractor(filename, jobs=jobs)
+    yield from gender_classifier.classify_rows(extractor.data, batch_size)
+    # TODO: should force types anywhere here or in FileExtractor?
+
+
+def memo_report(hits, misses):
+    hit_rate = hits / (hits + misses) if hits + misses else 0.0
+    return (
+        f"Names classification memo: {hits} hits, {misses} misses "
+        f"({hit_rate:.1%} hit rate)"
+    )
+
+
+def init_worker(gender_filename):
+    global worker_classifier
+    worker_classifier = NameClassifier(gender_filename)
+    worker_classifier.load()
+
+
+def extract_file(args):
+    """Runs in a worker process (the extractor class is found by institution
+    and state): saves the rows in the chunk file and returns how many rows,
+    plus the names memo hits and misses of this file"""
+    institution, state, filename, chunk_filename, field_names = args
+    Extractor = FileExtractor.get_child(state=state, institution=institution)
+    hits, misses = worker_classifier.hits, worker_classifier.misses
+    rows = extract_rows(Extractor, filename, worker_classifier)
+    count = write_chunk(chunk_filename, field_names, rows)
+    return count, worker_classifier.hits - hits, worker_classifier.misses - misses
 
 
 def main():
@@ -24,9 +64,28 @@ def main():
     parser.add_argument("--data_path", default=data_path.absolute())
     parser.add_argument("--filename")
     parser.add_argument("--output")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes extracting files in parallel (0 uses all CPUs)",
+    )
+    parser.add_argument(
+        "--pdf-jobs",
+        type=int,
+        default=1,
+        help="Number of processes extracting the pages of each PDF file (0 uses all CPUs)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Extract all the files, even the ones not changed since the last run",
+    )
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
     parser.add_argument("institution", choices=institutions)
     parser.add_argument("state", choices=states)
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     institution, state = args.institution, args.state
     output_path = Path("data")
     data_path = Path(args.data_path)
@@ -45,9 +104,9 @@ def main():
             for filename_pattern in filename_patterns
             for filename in glob.glob(str(filename_pattern))
         )
-    output_filename = (
-        args.output or output_path / f"ore-{institution.lower()}-{state.lower()}.csv.gz"
-    )
+    name = f"ore-{institution.lower()}-{state.lower()}"
+    extension = "csv.gz" if args.format == "csv" else "parquet"
+    output_filename = Path(args.output or output_path / f"{name}.{extension}")
     if not output_filename.parent.exists():
         output_filename.parent.mkdir(parents=True)
     desc = f"{institution} {state}"
@@ -64,19 +123,53 @@ def main():
         "rendimento_liquido",
         "observacao",
     )
-    gender_classifier = NameClassifier(gender_filename)
-    gender_classifier.load()
-    fobj = open_compressed(output_filename, mode="w", encoding="utf-8")
-    writer = csv.DictWriter(fobj, fieldnames=field_names)
-    writer.writeheader()
-    for filename in tqdm(filenames, desc=desc):
-        extractor = Extractor(filename)
-        for row in extractor.data:
-            nome = row["nome"]
-            row["genero"] = gender_classifier.classify(nome) if nome else ""
-            writer.writerow(row)
-        # TODO: should force types anywhere here or in FileExtractor?
-    fobj.close()
+
+    # The rows of each file are saved in a cached chunk, so only new or changed
+    # files are extracted and the output is assembled from the chunks
+    cache = ConversionCache(
+        settings.CACHE_PATH / name, data_path, dependencies=[gender_filename]
+    )
+    cache.load()
+    pending = [
+        filename for filename in filenames if args.full or not cache.is_fresh(filename)
+    ]
+    jobs = args.jobs or os.cpu_count()
+    if jobs == 1 and pending:
+        gender_classifier = NameClassifier(gender_filename)
+        gender_classifier.load()
+        for filename in tqdm(pending, desc=desc):
+            rows = extract_rows(Extractor, filename, gender_classifier, args.pdf_jobs)
+            count = write_chunk(cache.chunk_filename(filename), field_names, rows)
+            cache.update(filename, count)
+        logger.info(memo_report(gender_classifier.hits, gender_classifier.misses))
+    elif pending:
+        NameClassifier(gender_filename).load()  # builds the index only once
+        # Pages of PDF files are extracted serially inside each worker.
+        # `map` returns the results in the order of `pending`.
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker, initargs=(gender_filename,)
+        ) as executor:
+            tasks = (
+                (institution, state, filename, cache.chunk_filename(filename), field_names)
+                for filename in pending
+            )
+            results = executor.map(extract_file, tasks)
+            hits = misses = 0
+            for filename, (count, file_hits, file_misses) in tqdm(
+                zip(pending, results), desc=desc, total=len(pending)
+            ):
+                cache.update(filename, count)
+                hits, misses = hits + file_hits, misses + file_misses
+        logger.info(memo_report(hits, misses))
+    logger.info(
+        f"{len(pending)} of {len(filenames)} files extracted, assembling {output_filename}"
+    )
+    if args.format == "csv":
+        cache.assemble(filenames, output_filename, field_names)
+    else:
+        writer = ParquetWriter(output_filename, field_names)
+        writer.writerows(cache.rows(filenames, field_names))
+        writer.close()
 
 
 if __name__ == "__main__":
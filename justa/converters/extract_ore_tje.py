@@ -5,15 +5,11 @@ from rows.utils import open_compressed
 from tqdm import tqdm
 
 from gender_classifier import NameClassifier
+from magistrados import read_partitions
 
 
-def convert_row(row):
+def convert_row(row, genero):
     nome = row["nome"]
-    if nome:
-        genero = gender_classifier.classify(nome)
-    else:
-        genero = ""
-
     tribunal = row["tribunal"]
     if "São Paulo" in tribunal:
         uf = "SP"
@@ -24,7 +20,7 @@ def convert_row(row):
 
     return {
         "ano": row["ano_de_referencia"],
-        "genero": genero,
+        "genero": genero or "",
         "instituicao": "TJE",
         "mes": row["mes_de_referencia"],
         "uf": uf,
@@ -61,14 +57,13 @@ gender_filename = DATA_PATH / "nomes.csv.gz"
 gender_classifier = NameClassifier(gender_filename)
 gender_classifier.load()
 
-reader_fobj = open_compressed(input_filename, mode="r", encoding="utf-8")
-reader = csv.DictReader(reader_fobj)
 output_fobj = open_compressed(output_filename, mode="w", encoding="utf-8")
 writer = csv.DictWriter(output_fobj, fieldnames=output_field_names)
 writer.writeheader()
 
-for row in tqdm(reader):
-    if row["tribunal"] in TRIBUNAIS:
-        writer.writerow(convert_row(row))
+for tribunal in TRIBUNAIS:
+    rows = gender_classifier.classify_rows(read_partitions(input_filename, tribunal))
+    for row in tqdm(rows, desc=tribunal):
+        writer.writerow(convert_row(row, row["genero"]))
 
 output_fobj.close()
@@ -1,33 +1,179 @@
 import csv
+import json
+import os
+import sqlite3
+from collections import OrderedDict
 from decimal import Decimal
 from pathlib import Path
 
 from rows.utils import open_compressed, slug
 
+import settings
+
+
+def source_info(filename):
+    stat = Path(filename).stat()
+    return json.dumps({"size": stat.st_size, "mtime": stat.st_mtime})
+
+
+def build_index(filename, index_filename):
+    """Saves the first names classified with a ratio of at least 0.95 in a
+    SQLite file, so the CSV is parsed only when it changes"""
+    temp_filename = index_filename.parent / f"{index_filename.name}.{os.getpid()}.tmp"
+    if temp_filename.exists():  # left by an interrupted run
+        temp_filename.unlink()
+
+    connection = sqlite3.connect(str(temp_filename))
+    connection.execute("CREATE TABLE source (info TEXT)")
+    connection.execute(
+        "CREATE TABLE names (first_name TEXT PRIMARY KEY, classification TEXT) "
+        "WITHOUT ROWID"
+    )
+    fobj = open_compressed(filename, encoding="utf-8")
+    reader = csv.DictReader(fobj)
+    connection.executemany(
+        "INSERT OR REPLACE INTO names VALUES (?, ?)",
+        (
+            (row["first_name"], row["classification"])
+            for row in reader
+            if Decimal(row["ratio"]) >= Decimal("0.95")
+        ),
+    )
+    fobj.close()
+    connection.execute("INSERT INTO source VALUES (?)", (source_info(filename),))
+    connection.commit()
+    connection.close()
+    temp_filename.rename(index_filename)
+
 
 class NameClassifier:
-    def __init__(self, filename):
-        self.filename = filename
-        self.cache = {}
+    def __init__(self, filename, memo_size=2 ** 16, cache_path=None):
+        self.filename = Path(filename)
+        name = self.filename.name.split(".")[0]
+        cache_path = Path(cache_path or settings.CACHE_PATH)
+        self.index_filename = cache_path / f"{name}.sqlite"
+        self.connection = None
+        # Names repeat every month, so the raw names are memoized (the least
+        # recently used are discarded)
+        self.memo = OrderedDict()
+        self.memo_size = memo_size
+        self.hits = self.misses = 0
 
     def load(self):
-        fobj = open_compressed(self.filename, encoding="utf-8")
-        reader = csv.DictReader(fobj)
-        for row in reader:
-            if Decimal(row["ratio"]) < 0.95:
-                continue
-            self.cache[row["first_name"]] = row["classification"]
-        fobj.close()
+        if not self.is_index_fresh():
+            self.index_filename.parent.mkdir(parents=True, exist_ok=True)
+            build_index(self.filename, self.index_filename)
+        uri = f"{self.index_filename.absolute().as_uri()}?mode=ro"
+        self.connection = sqlite3.connect(uri, uri=True)
 
-    def classify(self, name):
-        if not self.cache:
-            raise RuntimeError("Classification cache not loaded (must call .load())")
-        name = slug(name).split("_")[0].upper()
-        result = self.cache.get(name, None)
-        if result in (None, ""):
+    def is_index_fresh(self):
+        if not self.index_filename.exists():
+            return False
+        connection = sqlite3.connect(str(self.index_filename))
+        try:
+            (info,), = connection.execute("SELECT info FROM source").fetchall()
+        except (sqlite3.DatabaseError, ValueError):
+            return False
+        finally:
+            connection.close()
+        return info == source_info(self.filename)
+
+    @staticmethod
+    def first_name(name):
+        return slug(name).split("_")[0].upper()
+
+    def _classify(self, name):
+        name = self.first_name(name)
+        result = self.connection.execute(
+            "SELECT classification FROM names WHERE first_name = ?", (name,)
+        ).fetchone()
+        if result is None or result[0] in (None, ""):
             return None
         else:
-            return result
+            return result[0]
+
+    def remember(self, name, classification):
+        self.memo[name] = classification
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
+    def classify(self, name):
+        if self.connection is None:
+            raise RuntimeError("Classification cache not loaded (must call .load())")
+        if name in self.memo:
+            self.hits += 1
+            self.memo.move_to_end(name)
+            return self.memo[name]
+
+        self.misses += 1
+        classification = self._classify(name)
+        self.remember(name, classification)
+        return classification
+
+    def classify_many(self, names, batch_size=500):
+        """Classifies a column of names (any iterable, like a list or a pandas
+        series): names in the memo are not looked up again, the others are
+        normalized once and their first names are looked up in batches. Empty
+        names (or NaN) are classified as None"""
+        if self.connection is None:
+            raise RuntimeError("Classification cache not loaded (must call .load())")
+
+        names = list(names)
+        valid = [name for name in names if isinstance(name, str) and name]
+        classifications = {}
+        first_names = {}
+        for name in dict.fromkeys(valid):  # distinct, in order
+            if name in self.memo:
+                self.memo.move_to_end(name)
+                classifications[name] = self.memo[name]
+            else:
+                first_names[name] = self.first_name(name)
+        self.misses += len(first_names)
+        self.hits += len(valid) - len(first_names)
+
+        unique = sorted(set(first_names.values()))
+        found = {}
+        for start in range(0, len(unique), batch_size):
+            batch = unique[start : start + batch_size]
+            placeholders = ", ".join("?" * len(batch))
+            found.update(
+                self.connection.execute(
+                    "SELECT first_name, classification FROM names "
+                    f"WHERE first_name IN ({placeholders})",
+                    batch,
+                )
+            )
+        for name, first_name in first_names.items():
+            classifications[name] = found.get(first_name) or None
+            self.remember(name, classifications[name])
+        return [classifications.get(name) for name in names]
+
+    def classify_rows(self, rows, batch_size=10_000):
+        """Sets the `genero` of each row (a dict with `nome`), classifying the
+        names in batches of rows, so the rows are streamed"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield from self._classify_rows(batch)
+                batch = []
+        yield from self._classify_rows(batch)
+
+    def _classify_rows(self, rows):
+        generos = self.classify_many(row["nome"] for row in rows)
+        for row, genero in zip(rows, generos):
+            row["genero"] = genero or ""
+            yield row
+
+    @property
+    def stats(self):
+        """Hits, misses and hit rate of the memoized names"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
 
 
 if __name__ == "__main__":
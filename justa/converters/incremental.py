@@ -0,0 +1,134 @@
+import csv
+import gzip
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+from rows.utils import open_compressed
+
+
+def file_hash(filename, chunk_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(filename, mode="rb") as fobj:
+        for chunk in iter(lambda: fobj.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def write_chunk(filename, field_names, rows):
+    """Saves the rows (without header) as gzip-compressed CSV and returns the
+    number of rows. The file is renamed only when complete"""
+    temp_filename = filename.parent / f"tmp-{filename.name}"  # keep extension
+    fobj = open_compressed(temp_filename, mode="w", encoding="utf-8")
+    writer = csv.DictWriter(fobj, fieldnames=field_names)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    fobj.close()
+    temp_filename.rename(filename)
+    return count
+
+
+class ConversionCache:
+    """Keeps the rows extracted from each input file in a compressed chunk and
+    a manifest with the hash, size, modification time and number of rows of
+    the files, so only new or changed files need to be extracted again.
+
+    `dependencies` are other files used in the conversion (such as the names
+    classification): if any of them changes, every file is extracted again.
+    """
+
+    def __init__(self, path, data_path, dependencies=()):
+        self.path = Path(path)
+        self.data_path = Path(data_path).resolve()
+        self.manifest_filename = self.path / "manifest.json"
+        self.dependencies = {
+            Path(filename).name: file_hash(filename) for filename in dependencies
+        }
+        self.files = {}
+        self.infos = {}
+
+    def load(self):
+        (self.path / "chunks").mkdir(parents=True, exist_ok=True)
+        if not self.manifest_filename.exists():
+            return
+        with open(self.manifest_filename) as fobj:
+            manifest = json.load(fobj)
+        if manifest["dependencies"] == self.dependencies:
+            self.files = manifest["files"]
+
+    def save(self):
+        manifest = {"dependencies": self.dependencies, "files": self.files}
+        temp_filename = self.path / "manifest.json.tmp"
+        with open(temp_filename, mode="w") as fobj:
+            json.dump(manifest, fobj, indent=2, sort_keys=True)
+        temp_filename.rename(self.manifest_filename)
+
+    def key(self, filename):
+        """The path relative to `data_path` (or the absolute path, for files
+        outside of it)"""
+        path = Path(filename).resolve()
+        try:
+            return str(path.relative_to(self.data_path))
+        except ValueError:
+            return str(path)
+
+    def chunk_filename(self, filename):
+        name = self.key(filename).replace("/", "__")
+        return self.path / "chunks" / f"{name}.csv.gz"
+
+    def file_info(self, filename):
+        """Hashes the file only if its size or modification time changed"""
+        if filename in self.infos:
+            return self.infos[filename]
+
+        stat = Path(filename).stat()
+        info = {"size": stat.st_size, "mtime": stat.st_mtime}
+        cached = self.files.get(self.key(filename), {})
+        if all(cached.get(key) == value for key, value in info.items()):
+            info["sha256"] = cached["sha256"]
+        else:
+            info["sha256"] = file_hash(filename)
+        self.infos[filename] = info
+        return info
+
+    def is_fresh(self, filename):
+        cached = self.files.get(self.key(filename))
+        if cached is None or not self.chunk_filename(filename).exists():
+            return False
+        return self.file_info(filename)["sha256"] == cached["sha256"]
+
+    def update(self, filename, row_count):
+        info = dict(self.file_info(filename), rows=row_count)
+        self.files[self.key(filename)] = info
+        self.save()
+
+    def rows(self, filenames, field_names):
+        """Reads the rows of the chunks of `filenames` (as dicts of strings)"""
+        for filename in filenames:
+            fobj = open_compressed(self.chunk_filename(filename), encoding="utf-8")
+            yield from csv.DictReader(fobj, fieldnames=field_names)
+            fobj.close()
+
+    def assemble(self, filenames, output_filename, field_names):
+        """Writes the header and the chunks of `filenames` (in this order) to
+        `output_filename`. Gzip files can be concatenated, so the chunks are
+        copied as they are when the output is also a gzip file"""
+        fobj = open_compressed(output_filename, mode="w", encoding="utf-8")
+        csv.DictWriter(fobj, fieldnames=field_names).writeheader()
+        if not str(output_filename).endswith(".gz"):
+            for filename in filenames:
+                with gzip.open(
+                    self.chunk_filename(filename), mode="rt", encoding="utf-8", newline=""
+                ) as chunk:
+                    shutil.copyfileobj(chunk, fobj)
+            fobj.close()
+            return
+
+        fobj.close()
+        with open(output_filename, mode="ab") as output:
+            for filename in filenames:
+                with open(self.chunk_filename(filename), mode="rb") as chunk:
+                    shutil.copyfileobj(chunk, output)
@@ -1,6 +1,14 @@
 import csv
+import fcntl
+import json
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
 
-from rows.utils import open_compressed
+from rows.utils import open_compressed, slug
+
+import settings
 
 
 TRIBUNAL_UF = {
@@ -10,24 +18,128 @@ TRIBUNAL_UF = {
 }
 
 
+def partitions_path(filename, cache_path=None):
+    cache_path = Path(cache_path or settings.CACHE_PATH)
+    return cache_path / f"{Path(filename).name.split('.')[0]}-partitions"
+
+
+def source_info(filename):
+    stat = Path(filename).stat()
+    return {"name": Path(filename).name, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def is_fresh(path, filename):
+    info_filename = path / "source.json"
+    if not info_filename.exists():
+        return False
+    with open(info_filename) as fobj:
+        return json.load(fobj) == source_info(filename)
+
+
+class ShardWriters:
+    """CSV writers for the shards, keeping at most `max_open` files open (the
+    least recently used is closed and opened again in append mode, creating
+    another gzip member, when needed)"""
+
+    def __init__(self, path, field_names, max_open=32):
+        self.path = path
+        self.field_names = field_names
+        self.max_open = max_open
+        self.open = OrderedDict()  # key: (fobj, writer)
+        self.created = set()
+
+    def writer(self, key):
+        if key in self.open:
+            self.open.move_to_end(key)
+            return self.open[key][1]
+
+        if len(self.open) == self.max_open:
+            _, (fobj, _) = self.open.popitem(last=False)
+            fobj.close()
+        shard_filename = self.path / key[0] / f"{key[1]}.csv.gz"
+        shard_filename.parent.mkdir(parents=True, exist_ok=True)
+        mode = "a" if key in self.created else "w"
+        fobj = open_compressed(shard_filename, mode=mode, encoding="utf-8")
+        writer = csv.DictWriter(fobj, fieldnames=self.field_names)
+        if key not in self.created:
+            writer.writeheader()
+            self.created.add(key)
+        self.open[key] = (fobj, writer)
+        return writer
+
+    def close(self):
+        for fobj, _ in self.open.values():
+            fobj.close()
+        self.open.clear()
+
+
+def partition(filename, cache_path=None):
+    """Splits Brasil.IO's `contracheque.csv.gz` in one file per tribunal and
+    year (`<tribunal slug>/<year>.csv.gz`, in `cache_path`), reading it only
+    once. Partitions are created again only if the source file changes. Safe
+    to be called by many processes at once: one builds the partitions
+    (holding a lock file) in its own temporary directory, renamed when
+    complete, and the others wait for it"""
+    path = partitions_path(filename, cache_path)
+    if is_fresh(path, filename):
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_filename = path.parent / f"{path.name}.lock"
+    with open(lock_filename, mode="w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if is_fresh(path, filename):  # built by another process meanwhile
+            return path
+
+        temp_path = path.parent / f"{path.name}.{os.getpid()}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        reader_fobj = open_compressed(filename, mode="r", encoding="utf-8")
+        reader = csv.DictReader(reader_fobj)
+        writers = ShardWriters(temp_path, reader.fieldnames)
+        for row in reader:
+            key = (slug(row["tribunal"]), row["ano_de_referencia"])
+            writers.writer(key).writerow(row)
+        reader_fobj.close()
+        writers.close()
+
+        with open(temp_path / "source.json", mode="w") as fobj:
+            json.dump(source_info(filename), fobj)
+        old_path = path.parent / f"{path.name}.{os.getpid()}.old"
+        if path.exists():
+            path.rename(old_path)
+        temp_path.rename(path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    return path
+
+
+def read_partitions(filename, tribunal, years=None, cache_path=None):
+    """Rows of `tribunal` (all years, if `years` is None) from the partitions
+    of `filename`, which are created if needed"""
+    path = partition(filename, cache_path) / slug(tribunal)
+    for shard_filename in sorted(path.glob("*.csv.gz")):
+        year = shard_filename.name.split(".")[0]
+        if years is not None and year not in years:
+            continue
+        fobj = open_compressed(shard_filename, mode="r", encoding="utf-8")
+        yield from csv.DictReader(fobj)
+        fobj.close()
+
+
 def extract_magistrados(filename, uf):
     for nome, sigla in TRIBUNAL_UF.items():
         if sigla == uf:
             tribunal = nome
             break
 
-    reader_fobj = open_compressed(filename, mode="r", encoding="utf-8")
-    for row in csv.DictReader(reader_fobj):
-        row_ano, row_tribunal = row["ano_de_referencia"], row["tribunal"]
-        if row_ano in ("2017", "2018") and row_tribunal == tribunal:
-            yield {
-                "ano": row_ano,
-                "cargo": row["cargo"],
-                "instituicao": "TJE",
-                "mes": row["mes_de_referencia"],
-                "nome": row["nome"],
-                "observacao": "",
-                "rendimento_bruto": row["total_de_rendimentos"],
-                "rendimento_liquido": row["rendimento_liquido"],
-                "uf": TRIBUNAL_UF[row_tribunal],
-            }
+    for row in read_partitions(filename, tribunal, years=("2017", "2018")):
+        yield {
+            "ano": row["ano_de_referencia"],
+            "cargo": row["cargo"],
+            "instituicao": "TJE",
+            "mes": row["mes_de_referencia"],
+            "nome": row["nome"],
+            "observacao": "",
+            "rendimento_bruto": row["total_de_rendimentos"],
+            "rendimento_liquido": row["rendimento_liquido"],
+            "uf": TRIBUNAL_UF[row["tribunal"]],
+        }
@@ -1,16 +1,18 @@
+#!/usr/bin/env python
+import argparse
 import csv
 import glob
-from decimal import Decimal
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from rows.utils import open_compressed
 from tqdm import tqdm
 
-
-def read_csv(filename):
-    fobj = open_compressed(filename, mode="r", encoding="utf-8")
-    yield from csv.DictReader(fobj)
-    fobj.close()
+import settings
+from parquet_output import ParquetWriter
 
 
 field_translation = {
@@ -25,30 +27,113 @@ field_translation = {
     "rendimento_bruto": ("rendimento_bruto", "total_bruto", "total_rendimentos"),
     "rendimento_liquido": ("rendimento_liquido",),
 }
+field_names = list(field_translation.keys())
+key_fields = ("ano", "mes", "instituicao", "uf", "nome", "cargo")
+
+
+def resolve_header(header):
+    """Maps each field of the consolidated file to the field in `header` (or
+    None), so the possible names are checked once per file and not per row"""
+    return {
+        key: next((name for name in possible_names if name in header), None)
+        for key, possible_names in field_translation.items()
+    }
+
+
+def convert_rows(filename):
+    fobj = open_compressed(filename, mode="r", encoding="utf-8")
+    reader = csv.DictReader(fobj)
+    mapping = resolve_header(reader.fieldnames or [])
+    for row in reader:
+        yield {key: row[name] if name else "" for key, name in mapping.items()}
+    fobj.close()
+
+
+def convert_file(args):
+    """Runs in a worker process: saves the converted rows of `filename` in
+    `chunk_filename`, so the main process just reads them in order"""
+    filename, chunk_filename = args
+    fobj = open_compressed(chunk_filename, mode="w", encoding="utf-8")
+    writer = csv.DictWriter(fobj, fieldnames=field_names)
+    writer.writerows(convert_rows(filename))
+    fobj.close()
+    return chunk_filename
+
+
+def read_chunk(chunk_filename):
+    fobj = open_compressed(chunk_filename, mode="r", encoding="utf-8")
+    yield from csv.DictReader(fobj, fieldnames=field_names)
+    fobj.close()
+    os.remove(chunk_filename)
+
+
+def unique_rows(rows, temp_path):
+    """Skips the rows with a repeated `key_fields`. The keys already seen are
+    kept in a SQLite database in `temp_path` (not in memory), so the memory
+    used does not grow with the number of rows"""
+    connection = sqlite3.connect(str(Path(temp_path) / "keys.sqlite"))
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("PRAGMA cache_size = -65536")  # 64MiB
+    connection.execute("CREATE TABLE keys (key TEXT PRIMARY KEY) WITHOUT ROWID")
+    cursor = connection.cursor()
+    for row in rows:
+        key = "\x00".join(row[field] for field in key_fields)
+        cursor.execute("INSERT OR IGNORE INTO keys VALUES (?)", (key,))
+        if cursor.rowcount == 1:  # not seen before
+            yield row
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input", default=str(Path(__file__).parent / "data" / "ore-*.csv*")
+    )
+    parser.add_argument("--output")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes converting files in parallel (0 uses all CPUs)",
+    )
+    args = parser.parse_args()
+    filenames = sorted(glob.glob(args.input))
+    extension = "csv.gz" if args.format == "csv" else "parquet"
+    output_filename = Path(
+        args.output or settings.PROJECT_DATA_PATH / f"consolidado.{extension}"
+    )
+    output_filename.parent.mkdir(parents=True, exist_ok=True)
+
+    if args.format == "csv":
+        fobj = open_compressed(output_filename, mode="w", encoding="utf-8")
+        writer = csv.DictWriter(fobj, fieldnames=field_names)
+        writer.writeheader()
+    else:
+        writer = ParquetWriter(output_filename, field_names)
+
+    with tempfile.TemporaryDirectory() as temp_path, ProcessPoolExecutor(
+        max_workers=args.jobs or os.cpu_count()
+    ) as executor:
+        tasks = (
+            (filename, Path(temp_path) / f"{index}.csv.gz")
+            for index, filename in enumerate(filenames)
+        )
+        # `map` returns the chunks in the order of `filenames`
+        chunk_filenames = executor.map(convert_file, tasks)
+        rows = (
+            row
+            for chunk_filename in tqdm(chunk_filenames, total=len(filenames))
+            for row in read_chunk(chunk_filename)
+        )
+        writer.writerows(unique_rows(rows, temp_path))
+
+    if args.format == "csv":
+        fobj.close()
+    else:
+        writer.close()
+
 
-# TODO: use settings.*DATA*
-base_path = Path(__file__).parent.parent.parent
-output_filename = base_path / "data" / "consolidado.csv.gz"
-filename_pattern = (
-    base_path / "justa/converters/data" / "ore-*.csv*"
-)  # TODO: may change to .csv.gz
-fobj = open_compressed(output_filename, mode="w", encoding="utf-8")
-writer = csv.DictWriter(fobj, fieldnames=list(field_translation.keys()))
-writer.writeheader()
-for filename in tqdm(glob.glob(str(filename_pattern))):
-    for row in read_csv(filename):
-        data = {}
-
-        # TODO: move these convertions to extractors
-        for key, possible_field_names in field_translation.items():
-            for field_name in possible_field_names:
-                if field_name in row:
-                    data[key] = row[field_name]
-                    break
-
-        if not data["rendimento_liquido"] and "ore-mpe-sp.csv" in filename:
-            if data["rendimento_liquido"] and row["desconto_total"]:
-                data["rendimento_liquido"] = str(
-                    Decimal(data["rendimento_liquido"]) - Decimal(row["desconto_total"])
-                )
-fobj.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+
+NULL = ("", "-", "null", "none", "nil", "n/a", "na")
+# Every character `str.strip` removes (like "\xa0" from HTML's &nbsp;), all
+# of them are below U+3001
+WHITESPACE = "".join(char for char in map(chr, range(0x3001)) if char.isspace())
+# A single `str.translate` pass removes the currency symbol, thousands
+# separators and whitespace (so "- 1,00" is negative) and uses "." for decimals
+TRANSLATION = str.maketrans(
+    {"R": None, "$": None, ".": None, ",": ".", **dict.fromkeys(WHITESPACE)}
+)
+
+
+def parse_money(value):
+    """Parses Brazilian money (like 'R$ 1.234,56' or '-1.234,56') into a
+    Decimal, or None if blank. Raises `ValueError` if it is not money"""
+    if type(value) is not str:
+        if value is None or isinstance(value, Decimal):
+            return value
+        return Decimal(str(value))
+
+    number = value.translate(TRANSLATION)
+    if number[-1:] == "-":  # like "1.234,56-"
+        number = "-" + number[:-1]
+    try:
+        return Decimal(number)
+    except InvalidOperation:  # blanks are checked only here (they are rare)
+        if number.lower() in NULL:
+            return None
+        raise ValueError(f"Value is not money: {value!r}")
+
+
+def parse_money_cents(value):
+    """Same as `parse_money`, but returns an int (in cents, rounding half up
+    if there are more than 2 decimal places)"""
+    if type(value) is not str:
+        number = parse_money(value)
+        if number is None:
+            return None
+        return int((number * 100).to_integral_value(ROUND_HALF_UP))
+
+    number = value.translate(TRANSLATION)
+    if number[-1:] == "-":
+        number = "-" + number[:-1]
+    negative = number[:1] == "-"
+    integer, _, decimals = number.lstrip("-").partition(".")
+    try:
+        if len(decimals) > 2:
+            return int((Decimal(number) * 100).to_integral_value(ROUND_HALF_UP))
+        cents = int(integer) * 100 + int(decimals.ljust(2, "0"))
+    except (InvalidOperation, ValueError):
+        if number.lower() in NULL:
+            return None
+        raise ValueError(f"Value is not money: {value!r}")
+    return -cents if negative else cents
+
+
+def parse_money_column(values, cents=False):
+    """Parses a column of values: repeated values (like '0,00') are parsed
+    only once"""
+    parse = parse_money_cents if cents else parse_money
+    parsed = {}
+    result = []
+    for value in values:
+        if value not in parsed:
+            parsed[value] = parse(value)
+        result.append(parsed[value])
+    return result
+
+
+if __name__ == "__main__":
+    # Micro-benchmark against the `str.replace` chain used before plus the
+    # conversion done by `rows.fields.DecimalField`
+    import random
+    import timeit
+
+    def old_parse_money(value):
+        value = (
+            (value or "")
+            .replace("R$", "")
+            .replace(".", "")
+            .replace(",", ".")
+            .replace("- ", "-")
+            .strip()
+        )
+        # What `rows.fields.DecimalField.deserialize` does with the string
+        if value is None or value.strip().lower() in NULL:
+            return None
+        elif isinstance(value, (Decimal, int, float)):
+            return Decimal(str(value))
+        return Decimal(value)
+
+    random.seed(42)
+    values = [
+        random.choice(("", "R$ ", "- ", "-"))
+        + f"{random.randint(0, 99999):,}".replace(",", ".")
+        + f",{random.randint(0, 99):02d}"
+        for _ in range(100_000)
+    ] + ["0,00"] * 50_000 + ["\xa0", "\r\n", " \xa0R$\xa01.234,56\r\n"]
+    for value in values:
+        assert old_parse_money(value) == parse_money(value), value
+
+    for name, function in (
+        ("str.replace chain", lambda: [old_parse_money(value) for value in values]),
+        ("parse_money", lambda: [parse_money(value) for value in values]),
+        ("parse_money_cents", lambda: [parse_money_cents(value) for value in values]),
+        ("parse_money_column", lambda: parse_money_column(values)),
+        ("parse_money_column (cents)", lambda: parse_money_column(values, cents=True)),
+    ):
+        seconds = min(timeit.repeat(function, number=1, repeat=5))
+        print(f"{name:>28}: {seconds:.3f}s ({len(values)} values)")
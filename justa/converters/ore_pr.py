@@ -7,6 +7,7 @@ from rows.plugins.utils import slug
 
 from base import FileExtractor
 from magistrados import extract_magistrados
+from pdf_tables import number_of_pages, pdf_pages_table_lines
 from utils import MoneyField
 
 
@@ -289,13 +290,14 @@ class TJEPRFileExtractor(FileExtractor):
                 # Data already converted in contracheque.csv
                 return
 
-            total_pages = rows.plugins.pdf.number_of_pages(self.filename)
-            for page in range(1, total_pages + 1):
-                table = rows.import_from_pdf(
-                    self.filename,
-                    page_numbers=(page,),
+            page_numbers = range(1, number_of_pages(self.filename) + 1)
+            tables = pdf_pages_table_lines(self.filename, page_numbers, jobs=self.jobs)
+            for page, lines in zip(page_numbers, tables):
+                table = rows.plugins.utils.create_table(
+                    lines,
                     fields=self.fields,
                     skip_header=page == 1,
+                    meta={"imported_from": "pdf"},
                 )
                 for row in table:
                     yield {
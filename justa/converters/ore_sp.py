@@ -6,6 +6,7 @@ from cached_property import cached_property
 
 from base import FileExtractor
 from magistrados import extract_magistrados
+from pdf_tables import number_of_pages, pdf_pages_table_lines
 from utils import MoneyField, detect_dialect, detect_encoding
 
 
@@ -106,7 +107,7 @@ class DPESPFileExtractor(FileExtractor):
             return
 
         filename, metadata = self.filename, self.metadata
-        pages = rows.plugins.pdf.number_of_pages(filename)
+        pages = number_of_pages(filename)
         self.old = (
             metadata["ano"] in (2013, 2014, 2015)
             or metadata["ano"] == 2016
@@ -114,10 +115,10 @@ class DPESPFileExtractor(FileExtractor):
         )
         starts_after = "INDENIZ." if self.old else "INDEN.)"
 
-        for page in range(2, pages + 1):
-            table = rows.plugins.pdf.pdf_table_lines(
-                filename, page_numbers=(page,), starts_after=starts_after
-            )
+        tables = pdf_pages_table_lines(
+            filename, range(2, pages + 1), jobs=self.jobs, starts_after=starts_after
+        )
+        for table in tables:
             for row_data in table:
                 if not row_data[0]:  # Almost empty header line
                     continue
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+CENTS = Decimal("0.01")
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+MONEY = pa.decimal128(14, 2)
+FIELD_TYPES = {
+    "ano": pa.int16(),
+    "mes": pa.int8(),
+    "instituicao": CATEGORY,
+    "uf": CATEGORY,
+    "genero": CATEGORY,
+    "rendimento_bruto": MONEY,
+    "rendimento_liquido": MONEY,
+}
+
+
+def empty(value):
+    return value is None or value == ""
+
+
+def to_int(value):
+    return None if empty(value) else int(value)
+
+
+def to_money(value):
+    return None if empty(value) else Decimal(str(value)).quantize(CENTS)
+
+
+def to_text(value):
+    return None if empty(value) else str(value)
+
+
+CONVERTERS = {pa.int8(): to_int, pa.int16(): to_int, MONEY: to_money}
+
+
+def column(values, field_type):
+    """Converts values from the extractors (or from CSV, as strings)"""
+    converter = CONVERTERS.get(field_type, to_text)
+    values = [converter(value) for value in values]
+    if field_type == CATEGORY:
+        return pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.array(values, type=field_type)
+
+
+class ParquetWriter:
+    """Writes rows (dicts) to a Parquet file in row groups, so only one row
+    group is kept in memory. Fields not in `FIELD_TYPES` are strings"""
+
+    def __init__(self, filename, field_names, row_group_size=100_000):
+        self.field_names = field_names
+        self.row_group_size = row_group_size
+        self.schema = pa.schema(
+            [(name, FIELD_TYPES.get(name, pa.string())) for name in field_names]
+        )
+        self.writer = pq.ParquetWriter(str(filename), self.schema, compression="zstd")
+        self.buffer = []
+
+    def writerow(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        columns = [
+            column([row.get(field.name) for row in self.buffer], field.type)
+            for field in self.schema
+        ]
+        self.writer.write_table(pa.Table.from_arrays(columns, schema=self.schema))
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+import rows
+
+
+@lru_cache(maxsize=1)
+def open_document(filename):
+    """Keeps the last document opened in each process, so extracting its pages
+    one by one does not open and parse the file again for every page"""
+    return rows.plugins.pdf.PyMuPDFBackend(filename).document
+
+
+class CachedDocumentBackend(rows.plugins.pdf.PyMuPDFBackend):
+    @property
+    def document(self):
+        return open_document(str(self.filename_or_fobj))
+
+
+def number_of_pages(filename):
+    return CachedDocumentBackend(filename).number_of_pages
+
+
+def page_table_lines(filename, page_number, **kwargs):
+    return list(
+        rows.plugins.pdf.pdf_table_lines(
+            filename,
+            page_numbers=(page_number,),
+            backend=CachedDocumentBackend,
+            **kwargs,
+        )
+    )
+
+
+def pdf_pages_table_lines(filename, page_numbers, jobs=1, **kwargs):
+    """Yields the table lines of each page (as a list) in the order of
+    `page_numbers`, extracting the pages in `jobs` processes (0 uses all CPUs
+    and each process opens the document once). `kwargs` are passed to
+    `pdf_table_lines` for each page, so `starts_after` is checked per page"""
+    extract = partial(page_table_lines, str(filename), **kwargs)
+    if jobs == 1:
+        yield from map(extract, page_numbers)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        yield from executor.map(extract, page_numbers)
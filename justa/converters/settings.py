@@ -5,3 +5,6 @@ from pathlib import Path
 PROJECT_DATA_PATH = Path(__file__).parent.parent.parent / "data"
 DROPBOX_DATA_PATH = Path(os.path.expanduser("~")) / "Dropbox/Justa_dados/Dados/"
 ORE_DATA_PATH = DROPBOX_DATA_PATH / "ETAPA_0/Eixo_ORE"
+# Files derived from the data (relative to where the scripts run, next to
+# their output), kept out of the shared Dropbox folder
+CACHE_PATH = Path("data") / "cache"
@@ -0,0 +1,44 @@
+import csv
+import gzip
+import sys
+
+import cli
+import settings
+from benchmark import generate_tje_sp
+
+
+def extract(monkeypatch, data_path, output_filename, jobs):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "cli.py",
+            "--data_path", str(data_path),
+            "--output", str(output_filename),
+            "--jobs", str(jobs),
+            "--full",
+            "TJE",
+            "SP",
+        ],
+    )
+    cli.main()
+    with gzip.open(output_filename, mode="rt", encoding="utf-8") as fobj:
+        return list(csv.DictReader(fobj))
+
+
+def test_jobs_output_is_the_same_as_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_PATH", tmp_path / "cache")
+    data_path = tmp_path / "data"
+    (data_path / "SP").mkdir(parents=True)
+    for month, count in (("01", 300), ("02", 10), ("03", 120), ("04", 0)):
+        filename = data_path / "SP" / f"ORE-SP-TJE-16{month}-ativos.csv"
+        generate_tje_sp(filename, count)
+    with gzip.open(data_path / "nomes.csv.gz", mode="wt", encoding="utf-8") as fobj:
+        fobj.write("first_name,classification,ratio\nMARIA,F,0.99\nJOSE,M,0.99\n")
+
+    serial = extract(monkeypatch, data_path, tmp_path / "serial.csv.gz", jobs=1)
+    parallel = extract(monkeypatch, data_path, tmp_path / "parallel.csv.gz", jobs=3)
+    assert parallel == serial
+    assert len(serial) == 430
+    assert [row["mes"] for row in serial] == ["1"] * 300 + ["2"] * 10 + ["3"] * 120
+    assert {row["genero"] for row in serial} == {"F", "M", ""}
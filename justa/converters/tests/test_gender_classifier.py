@@ -0,0 +1,48 @@
+import csv
+import gzip
+
+import pytest
+
+from gender_classifier import NameClassifier
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    filename = tmp_path / "nomes.csv.gz"
+    with gzip.open(filename, mode="wt", encoding="utf-8", newline="") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(("first_name", "classification", "ratio"))
+        writer.writerows(
+            (("MARIA", "F", "0.99"), ("JOSE", "M", "0.99"), ("ALEX", "M", "0.6"))
+        )
+    classifier = NameClassifier(filename, memo_size=2, cache_path=tmp_path / "cache")
+    classifier.load()
+    assert classifier.index_filename.parent == tmp_path / "cache"
+    return classifier
+
+
+def test_classify_many_uses_the_memo(classifier):
+    names = ["Maria Silva", "José Souza", "Maria Silva", "", float("nan"), "Alex Lima"]
+    assert classifier.classify_many(names) == ["F", "M", "F", None, None, None]
+    assert classifier.stats["misses"] == 3
+    assert list(classifier.memo) == ["José Souza", "Alex Lima"]  # memo_size=2
+
+    assert classifier.classify("Alex Lima") is None
+    assert classifier.classify_many(["José Souza", "Maria Silva"]) == ["M", "F"]
+    assert classifier.stats["hits"] == 3  # "Maria Silva" was discarded
+    assert classifier.stats["misses"] == 4
+
+
+def test_classify_rows_streams_in_batches(classifier):
+    consumed = []
+
+    def rows():
+        for nome in ("Maria Silva", "José Souza", "Joana Lima", "Alex Lima", ""):
+            consumed.append(nome)
+            yield {"nome": nome}
+
+    classified = classifier.classify_rows(rows(), batch_size=2)
+    first = next(classified)
+    assert first == {"nome": "Maria Silva", "genero": "F"}
+    assert len(consumed) == 2  # only the first batch was read
+    assert [row["genero"] for row in classified] == ["M", "", "", ""]
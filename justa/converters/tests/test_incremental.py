@@ -0,0 +1,18 @@
+from incremental import ConversionCache
+
+
+def test_key_relative_to_data_path(tmp_path):
+    data_path = tmp_path / "data"
+    cache = ConversionCache(tmp_path / "cache", data_path)
+    key = cache.key(data_path / "SP" / "ORE-SP-TJE-1801.ods")
+    assert key == "SP/ORE-SP-TJE-1801.ods"
+    assert cache.chunk_filename(data_path / "SP" / "ORE-SP-TJE-1801.ods").name == (
+        "SP__ORE-SP-TJE-1801.ods.csv.gz"
+    )
+
+
+def test_key_outside_data_path(tmp_path):
+    cache = ConversionCache(tmp_path / "cache", tmp_path / "data")
+    filename = tmp_path / "elsewhere" / "ORE-SP-TJE-1801.ods"
+    assert cache.key(filename) == str(filename.resolve())
+    assert cache.chunk_filename(filename).parent == tmp_path / "cache" / "chunks"
@@ -0,0 +1,59 @@
+import csv
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+
+from magistrados import ShardWriters, partition, read_partitions
+
+
+FIELD_NAMES = ("tribunal", "ano_de_referencia", "mes_de_referencia", "nome")
+
+
+def write_contracheque(filename, count=300):
+    tribunals = ("Tribunal de Justiça de São Paulo", "Tribunal de Justiça do Ceará")
+    with gzip.open(filename, mode="wt", encoding="utf-8", newline="") as fobj:
+        writer = csv.DictWriter(fobj, fieldnames=FIELD_NAMES)
+        writer.writeheader()
+        for index in range(count):
+            writer.writerow(
+                {
+                    "tribunal": tribunals[index % 2],
+                    "ano_de_referencia": str(2015 + index % 5),
+                    "mes_de_referencia": str(index % 12 + 1),
+                    "nome": f"NOME {index}",
+                }
+            )
+
+
+def test_shard_writers_reopen_in_append_mode(tmp_path):
+    writers = ShardWriters(tmp_path, ["nome"], max_open=2)
+    for index in range(30):
+        writers.writer(("tribunal", str(index % 5))).writerow({"nome": index})
+    assert len(writers.open) == 2
+    writers.close()
+
+    with gzip.open(tmp_path / "tribunal" / "0.csv.gz", mode="rt") as fobj:
+        assert [row["nome"] for row in csv.DictReader(fobj)] == [
+            "0", "5", "10", "15", "20", "25"
+        ]
+
+
+def test_partition_in_many_processes(tmp_path):
+    data_path, cache_path = tmp_path / "data", tmp_path / "cache"
+    data_path.mkdir()
+    filename = data_path / "contracheque.csv.gz"
+    write_contracheque(filename)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        paths = set(executor.map(partition, [filename] * 8, [cache_path] * 8))
+    assert len(paths) == 1
+    assert [path.name for path in data_path.iterdir()] == ["contracheque.csv.gz"]
+    assert sorted(path.name for path in cache_path.iterdir()) == [
+        "contracheque-partitions",
+        "contracheque-partitions.lock",
+    ]
+
+    tribunal = "Tribunal de Justiça do Ceará"
+    rows = list(read_partitions(filename, tribunal, cache_path=cache_path))
+    assert len(rows) == 150
+    rows = list(read_partitions(filename, tribunal, ("2016",), cache_path))
+    assert {row["ano_de_referencia"] for row in rows} == {"2016"}
+    assert len(rows) == 30
@@ -0,0 +1,109 @@
+import csv
+import gzip
+import sys
+
+import merge_files
+from merge_files import resolve_header, unique_rows
+
+
+def write_input(filename, field_names, rows):
+    with gzip.open(filename, mode="wt", encoding="utf-8", newline="") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(field_names)
+        writer.writerows(rows)
+
+
+def read_output(filename):
+    with gzip.open(filename, mode="rt", encoding="utf-8") as fobj:
+        return list(csv.DictReader(fobj))
+
+
+def row(nome, cargo="Juiz", **kwargs):
+    data = {
+        "ano": "2018",
+        "mes": "1",
+        "instituicao": "TJE",
+        "uf": "SP",
+        "nome": nome,
+        "cargo": cargo,
+    }
+    data.update(kwargs)
+    return data
+
+
+def test_resolve_header():
+    mapping = resolve_header(["ano", "nome", "total_rendimentos"])
+    assert mapping["rendimento_bruto"] == "total_rendimentos"
+    assert mapping["nome"] == "nome"
+    assert mapping["genero"] is None
+
+    mapping = resolve_header(["total_bruto", "total_rendimentos"])
+    assert mapping["rendimento_bruto"] == "total_bruto"  # first alias found
+
+
+def test_unique_rows_keeps_the_first(tmp_path):
+    rows = [
+        row("ANA", observacao="first"),
+        row("BIA"),
+        row("ANA", observacao="second"),
+        row("ANA", cargo="Desembargador"),
+    ]
+    result = list(unique_rows(rows, tmp_path))
+    assert [(r["nome"], r["cargo"]) for r in result] == [
+        ("ANA", "Juiz"), ("BIA", "Juiz"), ("ANA", "Desembargador")
+    ]
+    assert result[0]["observacao"] == "first"
+
+
+def merge(monkeypatch, input_path, output_filename, jobs):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "merge_files.py",
+            "--input", str(input_path / "ore-*.csv.gz"),
+            "--output", str(output_filename),
+            "--jobs", str(jobs),
+        ],
+    )
+    merge_files.main()
+    return read_output(output_filename)
+
+
+def test_merge(tmp_path, monkeypatch):
+    input_path = tmp_path / "input"
+    input_path.mkdir()
+    key = ("ano", "mes", "instituicao", "uf", "nome", "cargo")
+    write_input(
+        input_path / "ore-mpe-sp.csv.gz",
+        key + ("genero", "total_bruto"),
+        [
+            ("2018", "1", "MPE", "SP", f"NOME {n}", "Promotor", "F", f"{n}.00")
+            for n in range(50)
+        ],
+    )
+    write_input(
+        input_path / "ore-tje-ce.csv.gz",
+        key + ("total_rendimentos", "rendimento_liquido"),
+        [("2018", "1", "TJE", "CE", "JOSE", "Juiz", "10.00", "8.00")] * 2
+        + [("2018", "1", "MPE", "SP", "NOME 3", "Promotor", "99.00", "")],
+    )
+    write_input(
+        input_path / "ore-tje-sp.csv.gz",
+        key + ("rendimento_bruto",),
+        [("2018", "2", "TJE", "SP", "MARIA", "Juíza", "20.00")],
+    )
+
+    serial = merge(monkeypatch, input_path, tmp_path / "serial.csv.gz", jobs=1)
+    parallel = merge(monkeypatch, input_path, tmp_path / "parallel.csv.gz", jobs=3)
+    assert parallel == serial
+    assert len(serial) == 52
+    assert [r["nome"] for r in serial[-2:]] == ["JOSE", "MARIA"]
+
+    first_file, repeated = serial[3], serial[50]
+    assert first_file["rendimento_bruto"] == "3.00"  # not the later "99.00"
+    assert first_file["genero"] == "F"
+    assert repeated["rendimento_bruto"] == "10.00"  # total_rendimentos
+    assert repeated["rendimento_liquido"] == "8.00"
+    assert repeated["genero"] == ""
+    assert serial[-1]["rendimento_bruto"] == "20.00"
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+import pytest
+
+from money import parse_money, parse_money_cents, parse_money_column
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    (
+        ("1.234,56", Decimal("1234.56")),
+        ("R$ 1.234,56", Decimal("1234.56")),
+        ("R$1.234.567,8", Decimal("1234567.8")),
+        ("-14.229,16", Decimal("-14229.16")),
+        ("- 14.229,16", Decimal("-14229.16")),
+        ("R$ -0,50", Decimal("-0.50")),
+        ("1.234,56-", Decimal("-1234.56")),
+        ("0,00", Decimal("0.00")),
+        ("42", Decimal("42")),
+        ("", None),
+        ("  ", None),
+        ("\xa0", None),
+        ("\r\n", None),
+        ("R$\xa01.234,56\xa0", Decimal("1234.56")),
+        ("-", None),
+        (None, None),
+        (Decimal("1.5"), Decimal("1.5")),
+        (3, Decimal("3")),
+    ),
+)
+def test_parse_money(value, expected):
+    assert parse_money(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    (
+        ("1.234,56", 123456),
+        ("-1,50", -150),
+        ("- 0,5", -50),
+        ("R$ 10", 1000),
+        ("0,125", 13),
+        ("", None),
+        ("\xa0", None),
+        ("\r\n", None),
+        (Decimal("-2.5"), -250),
+    ),
+)
+def test_parse_money_cents(value, expected):
+    assert parse_money_cents(value) == expected
+
+
+@pytest.mark.parametrize("function", (parse_money, parse_money_cents))
+def test_parse_invalid_money(function):
+    with pytest.raises(ValueError):
+        function("abc")
+
+
+def test_parse_money_column():
+    values = ["1,00", "", "1,00", "-2,50"]
+    expected = [Decimal("1"), None, Decimal("1"), Decimal("-2.5")]
+    assert parse_money_column(values) == expected
+    assert parse_money_column(values, cents=True) == [100, None, 100, -250]
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parquet_output import CATEGORY, MONEY, ParquetWriter
+
+
+FIELD_NAMES = ("ano", "mes", "uf", "nome", "rendimento_bruto", "rendimento_liquido")
+
+
+def test_schema_types(tmp_path):
+    filename = tmp_path / "ore.parquet"
+    writer = ParquetWriter(filename, FIELD_NAMES)
+    writer.writerow(
+        {
+            "ano": "2018",
+            "mes": 12,
+            "uf": "SP",
+            "nome": "MARIA",
+            "rendimento_bruto": "1234.5",
+            "rendimento_liquido": Decimal("1000.123"),
+        }
+    )
+    writer.close()
+
+    schema = pq.read_schema(str(filename))
+    assert schema.field("ano").type == pa.int16()
+    assert schema.field("mes").type == pa.int8()
+    assert schema.field("uf").type == CATEGORY
+    assert schema.field("nome").type == pa.string()
+    assert schema.field("rendimento_bruto").type == MONEY
+    row, = pq.read_table(str(filename)).to_pylist()
+    assert row == {
+        "ano": 2018,
+        "mes": 12,
+        "uf": "SP",
+        "nome": "MARIA",
+        "rendimento_bruto": Decimal("1234.50"),
+        "rendimento_liquido": Decimal("1000.12"),
+    }
+
+
+def test_empty_and_missing_values_are_null(tmp_path):
+    filename = tmp_path / "ore.parquet"
+    writer = ParquetWriter(filename, FIELD_NAMES)
+    writer.writerow({"ano": "", "uf": None, "nome": "", "rendimento_bruto": ""})
+    writer.close()
+
+    row, = pq.read_table(str(filename)).to_pylist()
+    assert row == {field: None for field in FIELD_NAMES}
+
+
+def test_row_groups(tmp_path):
+    filename = tmp_path / "ore.parquet"
+    writer = ParquetWriter(filename, FIELD_NAMES, row_group_size=10)
+    writer.writerows({"ano": 2018, "mes": 1, "nome": f"NOME {n}"} for n in range(25))
+    assert len(writer.buffer) == 5  # only the last row group is in memory
+    writer.close()
+
+    parquet_file = pq.ParquetFile(str(filename))
+    assert parquet_file.metadata.num_row_groups == 3
+    names = parquet_file.read().column("nome").to_pylist()
+    assert names == [f"NOME {n}" for n in range(25)]
+
+
+def test_no_rows(tmp_path):
+    filename = tmp_path / "ore.parquet"
+    ParquetWriter(filename, FIELD_NAMES).close()
+    assert pq.read_table(str(filename)).num_rows == 0
@@ -0,0 +1,22 @@
+from time import sleep
+
+import pytest
+
+import pdf_tables
+from pdf_tables import pdf_pages_table_lines
+
+
+def fake_page_table_lines(filename, page_number, **kwargs):
+    """The first pages are the slowest, so they finish last when parallel"""
+    sleep((10 - page_number) * 0.02)
+    return [[filename, str(page_number), kwargs.get("starts_after", "")]]
+
+
+@pytest.mark.parametrize("jobs", (1, 3, 0))
+def test_pages_in_the_given_order(jobs, monkeypatch):
+    monkeypatch.setattr(pdf_tables, "page_table_lines", fake_page_table_lines)
+    page_numbers = [2, 1, 3, 4, 5, 6, 7, 8, 9]
+    tables = list(
+        pdf_pages_table_lines("ore.pdf", page_numbers, jobs=jobs, starts_after="Nome")
+    )
+    assert tables == [[["ore.pdf", str(number), "Nome"]] for number in page_numbers]
@@ -1,21 +1,15 @@
 import rows
 import rows.utils
 
+from money import parse_money
+
 
 class MoneyField(rows.fields.DecimalField):
     """Field to deserialize Brazilian money (like '1.234,56') into Decimal"""
 
     @classmethod
     def deserialize(cls, value):
-        value = (
-            (value or "")
-            .replace("R$", "")
-            .replace(".", "")
-            .replace(",", ".")
-            .replace("- ", "-")
-            .strip()
-        )
-        return super().deserialize(value)
+        return parse_money(value)
 
 
 def detect_dialect(filename, encoding, sample_size=1024 * 1024):
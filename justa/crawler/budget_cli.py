@@ -3,9 +3,10 @@ import argparse
 
 import rows
 
-from budget_base import get_actions_for_state, Action
-from budget_sp import SaoPauloBudgetExecutionSpider
-from budget_ce import CearaBudgetExecutionSpider
+from justa.budget_actions import Action
+from justa.spiders.budget_base import get_actions_for_state
+from justa.spiders.budget_sp import SaoPauloBudgetExecutionSpider
+from justa.spiders.budget_ce import CearaBudgetExecutionSpider
 
 
 spiders = {"CE": CearaBudgetExecutionSpider, "SP": SaoPauloBudgetExecutionSpider}
@@ -18,13 +19,24 @@ def main():
     parser.add_argument("--action", type=int)
     parser.add_argument("--quiet", action="store_true")
     parser.add_argument("--headless", action="store_true")
+    parser.add_argument(
+        "--browsers", type=int, default=1, help="Browser sessions executing actions"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=2, help="Retries of each failed action"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use only the local copy of the actions spreadsheet",
+    )
     args = parser.parse_args()
     if args.year is None and args.action is None:
-        actions = get_actions_for_state(args.state)
+        actions = get_actions_for_state(args.state, offline=args.offline)
     elif args.action is None:
         actions = [
             action
-            for action in get_actions_for_state(args.state)
+            for action in get_actions_for_state(args.state, offline=args.offline)
             if action.year == args.year
         ]
     else:
@@ -32,18 +44,26 @@ def main():
             Action(year=args.year, code=args.action, state=args.state, name="Unknown")
         ]
 
-    spider = spiders[args.state](headless=args.headless)
-    for action in actions:
-        if not args.quiet:
-            print(
-                f"Downloading budget execution for {action.state} ({action.code} @ {action.year})"
-            )
-        table = spider.execute(action.year, action.code)
+    spider = spiders[args.state](
+        headless=args.headless, browsers=args.browsers, retries=args.retries
+    )
+    if not args.quiet:
+        print(
+            f"Downloading budget execution for {len(actions)} actions "
+            f"with {args.browsers} browser(s)"
+        )
+    for action, result in spider.execute_all(actions):
+        if result is None:
+            print(f"  failed: {action.state} ({action.code} @ {action.year})")
+            continue
 
         output_filename = f"{action.state}-{action.year}-{action.code}.csv"
-        rows.export_to_csv(table, output_filename)
+        rows.export_to_csv(rows.import_from_dicts(result), output_filename)
         if not args.quiet:
-            print(f"  done (saved to {output_filename})")
+            print(
+                f"  {action.state} ({action.code} @ {action.year}) done "
+                f"(saved to {output_filename})"
+            )
     spider.close()
 
 
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from time import time
+
+import requests
+import rows
+
+from justa.settings import (
+    BUDGET_ACTIONS_CACHE,
+    BUDGET_ACTIONS_OFFLINE,
+    BUDGET_ACTIONS_TTL,
+    BUDGET_ACTIONS_URL
+)
+
+
+logger = logging.getLogger(__name__)
+Action = namedtuple('Action', ['year', 'state', 'name', 'code'])
+
+
+class ActionsCatalogError(Exception):
+    pass
+
+
+class ActionsCatalog:
+    """Local copy of the spreadsheet listing the budget actions of each state.
+    The CSV is saved in `path` (with its ETag and Last-Modified headers in a
+    JSON file beside it) and revalidated with a conditional request only when
+    it is older than `ttl` seconds, so most runs do not touch the network. In
+    `offline` mode only the local copy is used"""
+
+    def __init__(self, url, path, ttl=24 * 60 * 60, offline=False, timeout=30):
+        self.url = url
+        self.path = Path(path).expanduser()
+        self.metadata_path = self.path.with_name(f'{self.path.name}.json')
+        self.ttl = ttl
+        self.offline = offline
+        self.timeout = timeout
+        self.lock = Lock()
+        self.table = None
+
+    @staticmethod
+    def write(path, content):
+        """Writes to a temporary file first, so an interrupted run does not
+        leave a truncated copy behind"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        temp_path.write_bytes(content)
+        temp_path.replace(path)
+
+    def metadata(self):
+        try:
+            with self.metadata_path.open() as fobj:
+                return json.load(fobj)
+        except (OSError, ValueError):
+            return {}
+
+    def save_metadata(self, metadata):
+        self.write(self.metadata_path, json.dumps(metadata).encode())
+
+    def is_fresh(self, metadata):
+        age = time() - metadata.get('fetched_at', 0)
+        return self.path.exists() and age < self.ttl
+
+    def refresh(self):
+        """Makes sure there is a local copy, downloading it again only if the
+        spreadsheet changed. A stale copy is used if the spreadsheet cannot be
+        reached"""
+        if self.offline:
+            if not self.path.exists():
+                raise ActionsCatalogError(
+                    f'No local copy of the budget actions at {self.path} '
+                    '(it is required in offline mode)'
+                )
+            return
+
+        metadata = self.metadata()
+        if self.is_fresh(metadata):
+            return
+
+        headers = {}
+        if self.path.exists() and metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if self.path.exists() and metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+        try:
+            response = requests.get(self.url, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException:
+            if not self.path.exists():
+                raise
+            logger.warning(
+                f'Could not revalidate the budget actions, using {self.path}',
+                exc_info=True
+            )
+            return
+
+        metadata['fetched_at'] = time()
+        if response.status_code == 304:  # not modified
+            self.save_metadata(metadata)
+            return
+
+        metadata['etag'] = response.headers.get('ETag')
+        metadata['last_modified'] = response.headers.get('Last-Modified')
+        self.write(self.path, response.content)
+        self.save_metadata(metadata)
+        logger.info(f'Budget actions downloaded to {self.path}')
+
+    def load(self):
+        """Parses the local copy once per process"""
+        with self.lock:
+            if self.table is None:
+                self.refresh()
+                self.table = rows.import_from_csv(str(self.path), encoding='utf-8')
+            return self.table
+
+    def actions_for_state(self, state):
+        return [
+            Action(
+                year=row.ano,
+                state=row.estado,
+                name=row.nome_acao,
+                code=row.codigo_acao
+            )
+            for row in self.load()
+            if row.estado == state
+            and all((row.ano, row.estado, row.codigo_acao, row.nome_acao))
+        ]
+
+
+@lru_cache(maxsize=None)
+def shared_catalog(offline=False):
+    """The catalog shared by the spiders and the CLI in the same process"""
+    return ActionsCatalog(
+        BUDGET_ACTIONS_URL,
+        BUDGET_ACTIONS_CACHE,
+        ttl=BUDGET_ACTIONS_TTL,
+        offline=offline or BUDGET_ACTIONS_OFFLINE
+    )
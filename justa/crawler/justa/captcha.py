@@ -0,0 +1,214 @@
+import logging
+from collections import defaultdict, deque, namedtuple
+from threading import Condition, Thread
+from time import time
+from urllib.parse import urlsplit
+
+from requests import post
+
+
+logger = logging.getLogger(__name__)
+Solution = namedtuple('Solution', ('token', 'request_id', 'solved_at'))
+Pending = namedtuple('Pending', ('key', 'requested_at'))
+
+
+class CaptchaError(Exception):
+    pass
+
+
+class CaptchaBroker:
+    """Solves reCAPTCHAs using 2captcha ahead of need: for each (site key,
+    site) pair a browser asked a solution for in the last `ttl` seconds, the
+    broker keeps `prefetch` solutions (plus one for each browser waiting)
+    requested or ready, polls all the outstanding requests in a single batched
+    call from a background thread and hands the solutions to whichever browser
+    session needs one, discarding the expired ones"""
+
+    NOT_READY = 'CAPCHA_NOT_READY'
+
+    def __init__(self, api_key, url='http://2captcha.com', prefetch=1,
+                 ttl=110, initial_wait=15, poll_interval=2, timeout=300):
+        self.api_key = api_key
+        self.url = url.rstrip('/')
+        self.prefetch = prefetch
+        self.ttl = ttl  # reCAPTCHA tokens last for 120 seconds
+        self.initial_wait = initial_wait  # 2captcha takes at least ~15s
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+        self.condition = Condition()
+        self.asked = {}  # (site key, site): when a solution was last asked
+        self.pageurls = {}  # (site key, site): last page URL, sent to 2captcha
+        self.waiting = defaultdict(int)  # (site key, site): browsers
+        self.pending = {}  # 2captcha request ID: Pending
+        self.ready = defaultdict(deque)  # (site key, site): Solutions
+        self.errors = deque(maxlen=1)
+        self.thread = None
+        self.running = False
+
+    @staticmethod
+    def key(sitekey, pageurl):
+        """reCAPTCHA solutions are valid for the site, not for a specific
+        page, so only the scheme and the host are part of the key"""
+        url = urlsplit(pageurl)
+        return sitekey, f'{url.scheme}://{url.netloc}'
+
+    def data(self, **kwargs):
+        data = dict(key=self.api_key, json=1)
+        data.update(kwargs)
+        return data
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+
+        self.thread = Thread(target=self.run, name='captcha-broker', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread:
+            self.thread.join()
+
+    def solve(self, sitekey, pageurl):
+        """Blocks until there is a fresh solution for this reCAPTCHA"""
+        key = self.key(sitekey, pageurl)
+        deadline = time() + self.timeout
+        self.start()
+
+        with self.condition:
+            if key not in self.asked:
+                self.condition.notify_all()  # wake up to request solutions
+            self.asked[key] = time()
+            self.pageurls[key] = pageurl
+
+            self.waiting[key] += 1
+            try:
+                while True:
+                    self.discard_expired()
+                    if self.ready[key]:
+                        solution = self.ready[key].popleft()
+                        self.condition.notify_all()  # to request another one
+                        return solution
+
+                    if self.errors:
+                        raise CaptchaError(self.errors.popleft())
+
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        raise CaptchaError(f'No reCAPTCHA solution for {key}')
+
+                    self.condition.wait(min(remaining, self.poll_interval))
+            finally:
+                self.waiting[key] -= 1
+
+    def report(self, request_id, success):
+        if not request_id:
+            return
+
+        action = 'reportgood' if success else 'reportbad'
+        post(f'{self.url}/res.php', data=self.data(action=action, id=request_id))
+
+    def discard_expired(self):
+        """Must be called holding the lock (i.e. within `self.condition`)"""
+        now = time()
+        for key, solutions in self.ready.items():
+            while solutions and now - solutions[0].solved_at > self.ttl:
+                expired = solutions.popleft()
+                logger.debug(f'Discarding expired solution {expired.request_id}')
+
+    def missing(self):
+        """Keys lacking requests, as many times as the requests they lack.
+        Keys nobody asked a solution for within `ttl` get no prefetching
+        (otherwise each expired solution would be paid for again). Must be
+        called holding the lock (i.e. within `self.condition`)"""
+        requested = defaultdict(int)
+        for pending in self.pending.values():
+            requested[pending.key] += 1
+
+        now = time()
+        for key, asked_at in self.asked.items():
+            prefetch = self.prefetch if now - asked_at <= self.ttl else 0
+            wanted = prefetch + self.waiting[key]
+            total = len(self.ready[key]) + requested[key]
+            yield from (key for _ in range(wanted - total))
+
+    def request(self, key):
+        sitekey, _ = key
+        with self.condition:
+            pageurl = self.pageurls[key]
+        data = self.data(googlekey=sitekey, method='userrecaptcha', pageurl=pageurl)
+        response = post(f'{self.url}/in.php', data=data).json()
+        if not response.get('status'):
+            raise CaptchaError(response.get('request'))
+        return response['request']
+
+    def poll(self, request_ids):
+        """Fetches the results of many requests in a single call"""
+        data = self.data(action='get', ids=','.join(request_ids))
+        response = post(f'{self.url}/res.php', data=data).json()
+        results = str(response.get('request') or '').split('|')
+        if len(results) != len(request_ids):  # probably an error message
+            raise CaptchaError(response.get('request'))
+        return dict(zip(request_ids, results))
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+
+                self.discard_expired()
+                missing = tuple(self.missing())
+                now = time()
+                due = tuple(
+                    request_id
+                    for request_id, pending in self.pending.items()
+                    if now - pending.requested_at >= self.initial_wait
+                )
+
+            try:
+                self.step(missing, due)
+            except Exception as error:  # let the browsers waiting know
+                logger.error(f'Error solving reCAPTCHAs: {error}')
+                with self.condition:
+                    self.errors.append(str(error))
+                    self.condition.notify_all()
+
+            with self.condition:
+                if self.running:
+                    self.condition.wait(self.poll_interval)
+
+    def step(self, missing, due):
+        """Requests the missing solutions and polls the due ones, without
+        holding the lock during these HTTP requests"""
+        for key in missing:
+            request_id = self.request(key)
+            with self.condition:
+                self.pending[request_id] = Pending(key, time())
+
+        if not due:
+            return
+
+        results = self.poll(due)
+        with self.condition:
+            for request_id, result in results.items():
+                pending = self.pending.get(request_id)
+                if result == self.NOT_READY or pending is None:
+                    continue
+
+                del self.pending[request_id]
+                if result.startswith('ERROR_'):  # e.g. unsolvable captcha
+                    logger.info(f'2captcha request {request_id}: {result}')
+                    continue
+
+                solution = Solution(result, request_id, time())
+                self.ready[pending.key].append(solution)
+
+            self.errors.clear()
+            self.condition.notify_all()
@@ -0,0 +1,39 @@
+import csv
+from pathlib import Path
+from threading import Lock
+
+
+class Checkpoint:
+    """Journal of the court orders already processed by a spider (and their
+    outcome), stored as a CSV file so an interrupted crawl can be resumed"""
+
+    CRAWLED, FAILED = 'crawled', 'failed'
+    field_names = ('code', 'forum', 'outcome')
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = Lock()
+        self.outcomes = {}
+
+        if self.path.exists():
+            with self.path.open() as fobj:
+                for row in csv.DictReader(fobj):
+                    key = (row['code'], row['forum'])
+                    self.outcomes[key] = row['outcome']
+
+    def __contains__(self, number):
+        """Whether a (code, forum) pair was successfully crawled before"""
+        return self.outcomes.get(tuple(number)) == self.CRAWLED
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def record(self, code, forum, outcome):
+        with self.lock:
+            is_new = not self.path.exists()
+            with self.path.open('a') as fobj:
+                writer = csv.DictWriter(fobj, fieldnames=self.field_names)
+                if is_new:
+                    writer.writeheader()
+                writer.writerow({'code': code, 'forum': forum, 'outcome': outcome})
+            self.outcomes[(code, forum)] = outcome
@@ -0,0 +1,117 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from fnmatch import fnmatch
+from pathlib import Path
+from select import select
+from time import sleep, time
+
+
+logger = logging.getLogger(__name__)
+IN_CLOSE_WRITE, IN_MOVED_TO = 0x08, 0x80
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, length (then the name)
+
+
+class DownloadTimeout(Exception):
+    pass
+
+
+def inotify(path, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+    """Returns a non-blocking inotify file descriptor watching `path`, or
+    `None` if inotify is not available (not on Linux, for example)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (AttributeError, OSError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(str(path)), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def event_names(fd):
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return
+    offset = 0
+    while offset < len(data):
+        _, _, _, length = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        yield os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+        offset += length
+
+
+class DownloadWatcher:
+    """Waits for a browser to finish downloading a file to `path`: a new file
+    matching one of `patterns`, not empty and with no `.part` file left in
+    the directory (browsers write to a `.part` file and then rename it). Uses
+    inotify events (a file closed for writing or moved into `path`) or, if
+    inotify is not available, lists the directory every `poll_interval`
+    seconds. Each browser session must have its own `path`"""
+
+    def __init__(self, path, patterns=('*',), timeout=300, poll_interval=0.5,
+                 use_inotify=True):
+        self.path = Path(path)
+        self.patterns = patterns
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.fd = None
+        self.before = set()
+
+    def __enter__(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self.use_inotify:
+            self.fd = inotify(self.path)
+            if self.fd is None:
+                logger.warning(f'inotify not available, polling {self.path}')
+        # listed after the watch starts, so no download is missed
+        self.before = set(os.listdir(self.path))
+        return self
+
+    def __exit__(self, *_):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def is_complete(self, name):
+        if name in self.before or name.endswith('.part'):
+            return False
+        if not any(fnmatch(name, pattern) for pattern in self.patterns):
+            return False
+        try:
+            if (self.path / name).stat().st_size == 0:
+                return False  # placeholder created when the download starts
+        except FileNotFoundError:
+            return False
+        return not any(other.endswith('.part') for other in os.listdir(self.path))
+
+    def wait(self):
+        """Returns the downloaded file (a `Path`) or raises `DownloadTimeout`"""
+        deadline = time() + self.timeout
+        while True:
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise DownloadTimeout(
+                    f'No download finished in {self.path} after {self.timeout}s'
+                )
+
+            if self.fd is None:
+                sleep(min(remaining, self.poll_interval))
+                names = os.listdir(self.path)
+            else:
+                # without events for a while the directory is listed anyway,
+                # in case a file was completed in a way inotify did not see
+                timeout = min(remaining, self.poll_interval * 10)
+                ready, _, _ = select([self.fd], [], [], timeout)
+                names = event_names(self.fd) if ready else os.listdir(self.path)
+
+            for name in names:
+                if self.is_complete(name):
+                    return self.path / name
@@ -1,7 +1,40 @@
+from collections import defaultdict
+from time import time
+
+from peewee import SqliteDatabase, chunked
+from twisted.internet.task import LoopingCall
+
 from justa import items, models
 
 
+# Default limit of variables in a SQLite statement (before SQLite 3.32)
+SQLITE_MAX_VARIABLES = 999
+
+
 class JustaPipeline(object):
+    """Buffers court orders per model and saves them with multi-row inserts
+    ignoring the ones already in the database, flushing each buffer when it
+    reaches `batch_size` items, when it is older than `flush_interval`
+    seconds (checked when items arrive and by a timer, so a stalled spider
+    does not hold them), and when the spider closes. After each flush the spider's
+    `item_saved` (if any) is called with every item saved (or already in the
+    database)"""
+
+    def __init__(self, stats=None, batch_size=100, flush_interval=10):
+        self.stats = stats
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffers = defaultdict(list)
+        self.started_at = {}
+        self.timer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            stats=crawler.stats,
+            batch_size=crawler.settings.getint('JUSTA_BATCH_SIZE', 100),
+            flush_interval=crawler.settings.getfloat('JUSTA_FLUSH_INTERVAL', 10),
+        )
 
     @staticmethod
     def get_model(item):
@@ -11,17 +44,79 @@ class JustaPipeline(object):
         }
         return mapping.get(type(item))
 
+    @staticmethod
+    def get_row(model, item, spider):
+        """Multi-row inserts need the same keys in every row"""
+        row = {
+            name: field.default
+            for name, field in model._meta.fields.items()
+            if field.default is not None
+        }
+        row.update(item)
+        row['source'] = spider.name
+        return row
+
     def process_item(self, item, spider):
         if isinstance(item, dict):
             return item
 
-        defaults = dict(item)
-        defaults['source'] = spider.name
-        data = {k: v for k, v in defaults.items()}
-
         model = self.get_model(item)
-        _, created = model.get_or_create(**data, defaults=defaults)
-        msg = f'Court order {data["number"]} from {data["source"]}'
-        status = 'created' if created else 'already exists'
-        spider.logger.info(f'{msg} {status}')
+        self.buffers[model].append((self.get_row(model, item, spider), item))
+        self.started_at.setdefault(model, time())
+
+        is_full = len(self.buffers[model]) >= self.batch_size
+        is_old = time() - self.started_at[model] >= self.flush_interval
+        if is_full or is_old:
+            self.flush(model, spider)
+
         return item
+
+    def open_spider(self, spider):
+        if self.flush_interval > 0:
+            self.timer = LoopingCall(self.flush_old, spider)
+            # buffers wait at most 1.5 * flush_interval seconds
+            self.timer.start(self.flush_interval / 2, now=False)
+
+    def flush_old(self, spider):
+        now = time()
+        for model, started_at in tuple(self.started_at.items()):
+            if now - started_at >= self.flush_interval:
+                self.flush(model, spider)
+
+    def flush(self, model, spider):
+        buffered = self.buffers.pop(model, [])
+        self.started_at.pop(model, None)
+        if not buffered:
+            return
+
+        rows = [row for row, _ in buffered]
+        database = model._meta.database
+        size = len(rows)
+        if isinstance(database, SqliteDatabase):
+            size = max(1, SQLITE_MAX_VARIABLES // len(rows[0]))
+
+        created = 0
+        with database.atomic():
+            for batch in chunked(rows, size):
+                query = model.insert_many(batch).on_conflict_ignore()
+                created += database.execute(query).rowcount
+
+        existing = len(rows) - created
+        spider.logger.info(
+            f'{len(rows)} court orders from {spider.name}: '
+            f'{created} created, {existing} already exist'
+        )
+        if self.stats:
+            self.stats.inc_value('justa/created', created)
+            self.stats.inc_value('justa/already_exists', existing)
+
+        item_saved = getattr(spider, 'item_saved', None)
+        if item_saved:
+            for _, item in buffered:
+                item_saved(item)
+
+    def close_spider(self, spider):
+        if self.timer is not None and self.timer.running:
+            self.timer.stop()
+        for model in tuple(self.buffers):
+            self.flush(model, spider)
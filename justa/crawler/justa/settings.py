@@ -76,6 +76,11 @@ ITEM_PIPELINES = {
     'justa.pipelines.JustaPipeline': 900,
 }
 
+# JustaPipeline saves items in batches of up to JUSTA_BATCH_SIZE items, or
+# when the oldest buffered item is older than JUSTA_FLUSH_INTERVAL seconds
+JUSTA_BATCH_SIZE = 100
+JUSTA_FLUSH_INTERVAL = 10
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://doc.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
@@ -121,3 +126,21 @@ FIREFOX_DRIVE_URL = config('FIREFOX_DRIVE_URL')
 # https://2captcha.com/
 
 TWO_CAPTCHA_API_KEY = config('TWO_CAPTCHA_API_KEY', default=None)
+TWO_CAPTCHA_URL = config('TWO_CAPTCHA_URL', default='http://2captcha.com')
+
+
+# Budget actions (the spreadsheet listing the actions of each state)
+
+BUDGET_ACTIONS_URL = config(
+    'BUDGET_ACTIONS_URL',
+    default=(
+        'https://docs.google.com/spreadsheets/d/'
+        '1epxFffymqv1t2s37rQ-p5eKpvecOIBzCfJPLI53wYTY/export?format=csv&'
+        'id=1epxFffymqv1t2s37rQ-p5eKpvecOIBzCfJPLI53wYTY&gid=1565988556'
+    )
+)
+BUDGET_ACTIONS_CACHE = config(
+    'BUDGET_ACTIONS_CACHE', default='/mnt/data/cache/budget-actions.csv'
+)
+BUDGET_ACTIONS_TTL = config('BUDGET_ACTIONS_TTL', default=24 * 60 * 60, cast=int)
+BUDGET_ACTIONS_OFFLINE = config('BUDGET_ACTIONS_OFFLINE', default=False, cast=bool)
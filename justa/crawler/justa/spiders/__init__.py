@@ -1,17 +1,27 @@
 import re
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from time import sleep
+from queue import Queue
+from threading import Lock, local
 
-from requests import post
-from scrapy import Spider
+from scrapy import FormRequest, Request, Selector, Spider
 from selenium import webdriver
+from twisted.internet.defer import Deferred
 from splinter.driver.webdriver import WebDriverElement
 from splinter.driver.webdriver.remote import WebDriver
 
+from justa import models
+from justa.captcha import CaptchaBroker
+from justa.checkpoint import Checkpoint
 from justa.items import CourtOrderESAJ
-from justa.settings import CHROME_DRIVE_URL, FIREFOX_DRIVE_URL, TWO_CAPTCHA_API_KEY
+from justa.settings import (
+    CHROME_DRIVE_URL,
+    FIREFOX_DRIVE_URL,
+    TWO_CAPTCHA_API_KEY,
+    TWO_CAPTCHA_URL
+)
 
 
 Decision = namedtuple('Decision', ('date', 'text'))
@@ -20,6 +30,38 @@ driver_url = {
     "chrome": CHROME_DRIVE_URL,
     "firefox": FIREFOX_DRIVE_URL,
 }
+HIDDEN = '[contains(translate(@style, " ", ""), "display:none")]'
+
+
+def cell_text(cell):
+    """Mimics the text Selenium reads from a table cell selector: whitespaces
+    are collapsed and only line breaks and block elements start new lines"""
+    chunks = (
+        re.sub(r'\s+', ' ', node.root) if isinstance(node.root, str) else '\n'
+        for node in cell.xpath('.//text() | .//br | .//div | .//p | .//tr')
+    )
+    lines = (line.strip() for line in ''.join(chunks).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def visible_cells(selector, expanded=None):
+    """Returns the text of every `td` in the selector, but as an empty string
+    if the cell is hidden (as Selenium does). `expanded` maps the ID of hidden
+    elements to be considered visible to the ID of the elements to be hidden
+    instead (as when clicking on a link to show more details)"""
+    expanded = expanded or {}
+    shown = ' or '.join(f'@id="{key}"' for key in expanded.keys())
+    replaced = ' or '.join(f'@id="{key}"' for key in expanded.values())
+    conditions = [f'ancestor-or-self::*{HIDDEN}']
+    if expanded:
+        conditions[0] += f'[not({shown})]'
+        conditions.append(f'ancestor-or-self::*[{replaced}]')
+
+    cells = []
+    for cell in selector.xpath('//td'):
+        is_hidden = any(cell.xpath(condition) for condition in conditions)
+        cells.append('' if is_hidden else cell_text(cell))
+    return tuple(cells)
 
 
 class RemoteWebDriver(WebDriver):
@@ -36,35 +78,42 @@ class SeleniumSpider(Spider):
 
     browser_name = "chrome"
     preferences = None
+    lazy_browser = False  # when true, subclasses open browsers when needed
 
     def __init__(self, headless=True, *args, **kwargs):
         super(SeleniumSpider, self).__init__(*args, **kwargs)
         # If using "scrapy craw -a headless=true" we must parse the string
         self.headless = str(headless).lower() == "true"
+        self.browser = None if self.lazy_browser else self.new_browser()
+
+    def new_browser(self, preferences=None):
         kwargs = {
             "headless": self.headless,
         }
-        options = self.get_browser_options()
+        options = self.get_browser_options(preferences)
         if options:
             kwargs.update(options.to_capabilities())
-        self.browser = RemoteWebDriver(
+        return RemoteWebDriver(
             browser=self.browser_name,
             url=driver_url[self.browser_name],
             **kwargs,
         )
 
-    def get_browser_options(self):
-        if self.preferences is None:
+    def get_browser_options(self, preferences=None):
+        """Options with `preferences`, or with the spider's ones if `None`"""
+        if preferences is None:
+            preferences = self.preferences
+        if preferences is None:
             return None
         else:
             if self.browser_name == "chrome":
                 options = webdriver.ChromeOptions()
-                options.add_experimental_option("prefs", self.preferences)
+                options.add_experimental_option("prefs", preferences)
                 return options
 
             elif self.browser_name == "firefox":
                 options = webdriver.FirefoxOptions()
-                for key, value in self.preferences.items():
+                for key, value in preferences.items():
                     options.set_preference(key, value)
                 return options
 
@@ -73,20 +122,139 @@ class ESAJSpider(SeleniumSpider):
     """Spider to crawl full text court orders from eSAJ systems, based on court
     orders number usually collected mannualy via LAI"""
     pattern = r'(\d{7}-\d{2}\.\d{4}).\d\.\d{2}\.(\d{4})'
-    start_urls = ('http://justa.org/',)  # fake (real ones happens in Selenium)
     recaptcha = False
     js_cache = {}
+    engines = ('browser', 'http')
+    lazy_browser = True
+
+    # IDs of the elements shown when clicking on `linkpartes` and
+    # `linkmovimentacoes`, mapped to the IDs of the elements they replace
+    expanded = {
+        'tableTodasPartes': 'tablePartesPrincipais',
+        'tabelaTodasMovimentacoes': 'tabelaUltimasMovimentacoes',
+    }
+
+    def __init__(self, source=None, browsers=1, engine='browser',
+                 checkpoint=False, skip_known=False, *args, **kwargs):
+        if engine not in self.engines:
+            raise ValueError(f'Engine must be one of: {", ".join(self.engines)}')
 
-    def __init__(self, source=None, *args, **kwargs):
         self.source = source or self.default_source
+        self.engine = engine
+
+        # If using "scrapy crawl -a checkpoint=true" we must parse the string
+        self.checkpoint = None
+        if str(checkpoint).lower() == 'true':
+            path = Path(self.source).parent / f'{self.name}.checkpoint.csv'
+            self.checkpoint = Checkpoint(path)
+        self.unsaved = {}  # id(item): (item, code, forum) not saved yet
+        self.skip_known = str(skip_known).lower() == 'true'
+
+        # each thread (i.e. each worker of the pool) sees its own browser
+        self.local = local()
         super(ESAJSpider, self).__init__(*args, **kwargs)
 
-    def error_handler(self, code, forum):
+        # If using "scrapy crawl -a browsers=8" we must parse the string
+        self.browsers = int(browsers)
+
+        # court orders are crawled by these threads, each one borrowing an
+        # idle browser, so the browsers never block Scrapy's reactor; browsers
+        # are opened only when needed (with the http engine, only if a
+        # reCAPTCHA shows up)
+        self.pool, self.idle, self.lock = [], Queue(), Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.browsers)
+        self.futures = set()
+
+        # a solution is requested ahead of need (besides the ones requested
+        # for the browsers waiting), since each one is paid and expires soon
+        self.captcha = None
+        if self.recaptcha:
+            self.captcha = CaptchaBroker(
+                TWO_CAPTCHA_API_KEY,
+                url=TWO_CAPTCHA_URL,
+                prefetch=1
+            )
+
+    @property
+    def browser(self):
+        return getattr(self.local, 'browser', None)
+
+    @browser.setter
+    def browser(self, value):
+        self.local.browser = value
+
+    @property
+    def request_id(self):
+        return getattr(self.local, 'request_id', None)
+
+    @request_id.setter
+    def request_id(self, value):
+        self.local.request_id = value
+
+    @property
+    def search_url(self):
+        return self.url.replace('open.do', 'search.do')
+
+    def full_number(self, code, forum):
         parts = (code, self.fixed_part_of_the_court_order_number, forum)
-        number = ''.join(parts)
+        return ''.join(parts)
+
+    @property
+    def known_numbers(self):
+        """Numbers of the court orders from this spider already saved in the
+        database"""
+        query = (
+            models.CourtOrderESAJ
+            .select(models.CourtOrderESAJ.number)
+            .where(models.CourtOrderESAJ.source == self.name)
+        )
+        return set(court_order.number for court_order in query)
+
+    @property
+    def pending_numbers(self):
+        """Same as `numbers`, skipping the ones already crawled according to
+        the checkpoint and the database (when these modes are enabled)"""
+        known = self.known_numbers if self.skip_known else set()
+        skipped = 0
+        for code, forum in self.numbers:
+            crawled = self.checkpoint is not None and (code, forum) in self.checkpoint
+            if crawled or self.full_number(code, forum) in known:
+                skipped += 1
+                continue
+            yield code, forum
+
+        if skipped:
+            self.logger.info(f'Skipped {skipped} court orders crawled before')
+
+    def save_checkpoint(self, code, forum, court_order):
+        """Failures are recorded right away, but court orders only after the
+        pipeline saves them (see `item_saved`), so the ones lost in a crash
+        are crawled again"""
+        if self.checkpoint is None:
+            return
+
+        if court_order:
+            self.unsaved[id(court_order)] = (court_order, code, forum)
+        else:
+            self.checkpoint.record(code, forum, Checkpoint.FAILED)
+
+    def item_saved(self, item):
+        """Called by the pipeline once `item` is in the database"""
+        unsaved = self.unsaved.pop(id(item), None)
+        if unsaved is not None:
+            _, code, forum = unsaved
+            self.checkpoint.record(code, forum, Checkpoint.CRAWLED)
+
+    def error_handler(self, code, forum, response=None):
+        self.save_checkpoint(code, forum, None)
+        number = self.full_number(code, forum)
         data_dir = Path(self.source).parent
-        screenshot = Path(data_dir) / f'debug-{number}.'
-        filename = self.browser.screenshot(str(screenshot), full=True)
+        if response is None:
+            screenshot = Path(data_dir) / f'debug-{number}.'
+            filename = self.browser.screenshot(str(screenshot), full=True)
+        else:
+            filename = Path(data_dir) / f'debug-{number}.html'
+            filename.write_bytes(response.body)
         self.logger.info(
             f'Unable to crawl court order {number}, '
             f'check {filename} for details'
@@ -99,8 +267,14 @@ class ESAJSpider(SeleniumSpider):
             self.logger.error(f'Cannot parse {value} as {format} date')
             return None
 
-    def parse_decision(self):
-        cells = tuple(td.text.strip() for td in self.browser.find_by_tag('td'))
+    def cells(self):
+        """Snapshot of the text of every table cell in the browser's current
+        page, parsed locally from the HTML (reading each cell with the
+        WebDriver would cost one remote call per cell)"""
+        return visible_cells(Selector(text=self.browser.html))
+
+    def parse_decision(self, cells=None):
+        cells = self.cells() if cells is None else cells
         decisions = []
 
         # get the date and the decision; skips two columns: the first columns
@@ -126,16 +300,17 @@ class ESAJSpider(SeleniumSpider):
         name = re.sub(pattern, '', value).strip()
         return Part(name, ', '.join(attorneys))
 
-    def parse_appeals(self):
+    def parse_appeals(self, cells=None):
         keywords = ('Recurso Extraordinário', 'Recurso Especial')
+        cells = self.cells() if cells is None else cells
         has_appeals = any(
-            self.browser.is_text_present(keyword)
+            keyword in cell
             for keyword in self.appeal_keywords
+            for cell in cells
         )
         if not has_appeals:
             return ''
 
-        cells = tuple(td.text.strip() for td in self.browser.find_by_tag('td'))
         appeals = []
 
         # get the date and the decision; skips two columns: the first columns
@@ -148,8 +323,8 @@ class ESAJSpider(SeleniumSpider):
 
         return '\n\n'.join(appeals) if appeals else ''
 
-    def parse_metadata(self):
-        cells = tuple(td.text.strip() for td in self.browser.find_by_tag('td'))
+    def parse_metadata(self, cells=None):
+        cells = self.cells() if cells is None else cells
         mapping = {
             'Processo:': 'number_and_status',
             'Números de origem:': 'source_numbers',
@@ -188,22 +363,16 @@ class ESAJSpider(SeleniumSpider):
             output[f'{key}_attorneys'] = part.attorneys
 
         # parse appeals
-        output['appeals'] = self.parse_appeals()
+        output['appeals'] = self.parse_appeals(cells)
 
         return output
 
-    @staticmethod
-    def two_captcha_data(**kwargs):
-        data = dict(key=TWO_CAPTCHA_API_KEY, json=1)
-        if kwargs:
-            data.update(kwargs)
-        return data
-
     def set_recaptcha_response_visibility(self, visible):
         action = 'show' if visible else 'hide'
         cached = self.js_cache.get(action)
         if cached:
             self.browser.execute_script(cached)
+            return
 
         with open(Path() / 'justa' / 'js' / f'{action}_recaptcha.js') as fobj:
             content = fobj.read()
@@ -211,34 +380,8 @@ class ESAJSpider(SeleniumSpider):
         self.js_cache[action] = content
         self.browser.execute_script(content)
 
-    def request_recaptcha_solution(self, recaptcha_key):
-        data = self.two_captcha_data(
-            googlekey=recaptcha_key,
-            method='userrecaptcha',
-            pageurl=self.browser.url
-        )
-        response = post("http://2captcha.com/in.php", data=data)
-        return response.json().get('request')
-
-    def fetch_recaptcha_solution(self):
-        if not self.request_id:
-            return
-
-        data = self.two_captcha_data(action="get", id=self.request_id)
-        response = post("http://2captcha.com/res.php", data=data)
-        result = response.json().get('request')
-        if not result or result == 'CAPCHA_NOT_READY':
-            return
-
-        return result
-
     def feedback_recaptcha_solution(self, success):
-        if not self.request_id:
-            return
-
-        action = 'reportgood' if success else 'reportbad'
-        data = self.two_captcha_data(action=action, id=self.request_id)
-        post("http://2captcha.com/res.php", data=data)
+        self.captcha.report(self.request_id, success)
 
     def solve_recaptcha(self):
         has_recaptcha = self.browser.is_element_present_by_css(
@@ -250,16 +393,11 @@ class ESAJSpider(SeleniumSpider):
 
         recaptcha = self.browser.find_by_css('.g-recaptcha').first
         recaptcha_id = recaptcha._element.get_attribute('data-sitekey')
-        self.request_id = self.request_recaptcha_solution(recaptcha_id)
-
-        sleep(15)
-        result = self.fetch_recaptcha_solution()
-        while not result:
-            sleep(2)
-            result = self.fetch_recaptcha_solution()
+        solution = self.captcha.solve(recaptcha_id, self.browser.url)
+        self.request_id = solution.request_id
 
         self.set_recaptcha_response_visibility(True)
-        self.browser.fill('g-recaptcha-response', result)
+        self.browser.fill('g-recaptcha-response', solution.token)
         self.set_recaptcha_response_visibility(False)
 
     def search(self, code, forum, recaptcha=False):
@@ -294,22 +432,132 @@ class ESAJSpider(SeleniumSpider):
             if self.browser.is_element_present_by_id(link_id):
                 self.browser.find_by_id(link_id).first.click()
 
-        decision = self.parse_decision()
+        return self.build_court_order(code, forum, self.cells())
+
+    def build_court_order(self, code, forum, cells=None, response=None):
+        decision = self.parse_decision(cells)
         if not decision or not decision.text or not decision.date:
-            self.error_handler(code, forum)
+            self.error_handler(code, forum, response)
             return
 
         data = {'decision': decision.text, 'decision_date': decision.date}
-        data.update(self.parse_metadata())
+        data.update(self.parse_metadata(cells))
 
         if not data.get('number'):
-            self.error_handler()
+            self.error_handler(code, forum, response)
             return
 
-        return CourtOrderESAJ(**data)
+        court_order = CourtOrderESAJ(**data)
+        self.save_checkpoint(code, forum, court_order)
+        return court_order
 
-    def parse(self, _):
-        for code, forum in self.numbers:
-            court_order = self.court_order(code, forum)
-            if court_order:
-                yield court_order
+    def start_requests(self):
+        if self.engine == 'http':
+            # get a session cookie before searching for court orders
+            yield Request(self.url, callback=self.search_requests)
+            return
+
+        # these requests do not touch the network (they are `data:` URIs),
+        # they only hand the numbers to the browsers at Scrapy's pace
+        for code, forum in self.pending_numbers:
+            yield Request(
+                'data:,',
+                meta={'code': code, 'forum': forum, 'dont_obey_robotstxt': True},
+                callback=self.parse,
+                dont_filter=True,
+            )
+
+    def search_requests(self, _):
+        for code, forum in self.pending_numbers:
+            yield FormRequest(
+                self.search_url,
+                method='GET',
+                formdata={
+                    'conversationId': '',
+                    'paginaConsulta': '1',
+                    'localPesquisa.cdLocal': '-1',
+                    'cbPesquisa': 'NUMPROC',
+                    'tipoNuProcesso': 'UNIFICADO',
+                    'numeroDigitoAnoUnificado': code,
+                    'foroNumeroUnificado': forum,
+                    'dePesquisaNuUnificado': self.full_number(code, forum),
+                    'dePesquisa': '',
+                    'uuidCaptcha': '',
+                    'pbEnviar': 'Pesquisar',
+                },
+                meta={'code': code, 'forum': forum},
+                callback=self.parse_court_order,
+                dont_filter=True,
+            )
+
+    def parse_court_order(self, response):
+        code, forum = response.meta['code'], response.meta['forum']
+        if response.css('.g-recaptcha'):
+            self.logger.debug(
+                f'Court order {self.full_number(code, forum)} requires a '
+                'reCAPTCHA, falling back to the browser'
+            )
+            return self.in_browser(code, forum)
+
+        if not response.css('#tabelaUltimasMovimentacoes'):
+            self.error_handler(code, forum, response)
+            return []
+
+        cells = visible_cells(response, self.expanded)
+        court_order = self.build_court_order(code, forum, cells, response)
+        return [court_order] if court_order else []
+
+    def borrow_browser(self):
+        """Takes an idle browser, opening a new one while the pool is smaller
+        than `browsers`"""
+        with self.lock:
+            if self.idle.empty() and len(self.pool) < self.browsers:
+                self.pool.append(self.new_browser())
+                return self.pool[-1]
+        return self.idle.get()
+
+    def worker(self, code, forum):
+        """Crawls a court order with an idle browser of the pool (it runs in
+        one of the executor's threads)"""
+        self.browser = self.borrow_browser()
+        try:
+            return self.court_order(code, forum)
+        except Exception:  # do not let one court order kill the pool
+            self.logger.exception(f'Worker failed on {code} {forum}')
+            self.error_handler(code, forum)
+        finally:
+            self.idle.put(self.browser)
+
+    def in_browser(self, code, forum):
+        """Returns a `Deferred` firing, in the reactor thread, with a list of
+        the court order crawled by the pool (empty if it failed)"""
+        from twisted.internet import reactor
+
+        future = self.executor.submit(self.worker, code, forum)
+        self.futures.add(future)
+        deferred = Deferred(lambda _: future.cancel())
+
+        def fire(future):
+            self.futures.discard(future)
+            if deferred.called:  # cancelled
+                return
+            if future.cancelled():
+                deferred.callback([])
+                return
+            court_order = future.result()
+            deferred.callback([court_order] if court_order else [])
+
+        future.add_done_callback(lambda f: reactor.callFromThread(fire, f))
+        return deferred
+
+    def parse(self, response):
+        return self.in_browser(response.meta['code'], response.meta['forum'])
+
+    def closed(self, _):
+        for future in tuple(self.futures):
+            future.cancel()
+        self.executor.shutdown(wait=True)  # only running court orders remain
+        if self.captcha is not None:
+            self.captcha.close()
+        for browser in self.pool:
+            browser.quit()
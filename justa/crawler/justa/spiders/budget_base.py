@@ -1,25 +1,17 @@
-import io
-from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from threading import local
 
-import requests
 import rows
 import splinter
 
+from justa.budget_actions import shared_catalog
 from justa.spiders import SeleniumSpider
 
 
-Action = namedtuple("Action", ["year", "state", "name", "code"])
-
-
-def get_actions_for_state(state):
-    url = "https://docs.google.com/spreadsheets/d/1epxFffymqv1t2s37rQ-p5eKpvecOIBzCfJPLI53wYTY/export?format=csv&id=1epxFffymqv1t2s37rQ-p5eKpvecOIBzCfJPLI53wYTY&gid=1565988556"
-    response = requests.get(url)
-    table = rows.import_from_csv(io.BytesIO(response.content), encoding="utf-8")
-    return [
-        Action(year=row.ano, state=row.estado, name=row.nome_acao, code=row.codigo_acao)
-        for row in table
-        if row.estado == state and all((row.ano, row.estado, row.codigo_acao, row.nome_acao))
-    ]
+def get_actions_for_state(state, offline=False):
+    """Actions from the local copy of the spreadsheet (see `ActionsCatalog`)"""
+    return shared_catalog(offline).actions_for_state(state)
 
 
 class BaseBudgetExecutionSpider(SeleniumSpider):
@@ -29,14 +21,112 @@ class BaseBudgetExecutionSpider(SeleniumSpider):
     value_to_wait_for = ""  # Value of an element to wait during operations
     value_wait_timeout = 30  # Seconds to wait for this value to be shown in the page
 
+    def __init__(self, browsers=1, retries=2, offline=False, *args, **kwargs):
+        # each thread (i.e. each worker of the pool) sees its own browser
+        self.local = local()
+        super().__init__(*args, **kwargs)
+
+        # If using "scrapy crawl -a browsers=4" we must parse the strings
+        self.retries = int(retries)
+        self.offline = str(offline).lower() == "true"
+        self.pool = [self.browser]
+        for _ in range(1, int(browsers)):
+            self.pool.append(self.new_browser())
+
+    @property
+    def browser(self):
+        return getattr(self.local, "browser", None)
+
+    @browser.setter
+    def browser(self, value):
+        self.local.browser = value
+
     @property
     def actions(self):
-        return get_actions_for_state(self.state)
+        return get_actions_for_state(self.state, offline=self.offline)
 
     def parse(self, _):
-        self.start_page()
-        for action in self.actions:
-            yield from self.execute(action.year, action.code)
+        for action, result in self.execute_all(self.actions):
+            if result is None:
+                self.logger.error(f"Giving up on action {action.code} @ {action.year}")
+                continue
+            yield from result
+
+    def execute_action(self, action, attempt):
+        """Returns the rows of the action, or `None` if it failed (after
+        restarting the page, so the session can be used again)"""
+        try:
+            return list(self.execute(action.year, action.code))
+        except Exception:
+            self.logger.exception(
+                f"Failed on action {action.code} @ {action.year} (attempt {attempt})"
+            )
+
+        try:
+            self.start_page()
+        except Exception:  # the next attempt restarts the page again
+            self.logger.exception("Failed to restart the page")
+
+    def worker(self, browser, actions, results):
+        """Executes the actions taken from the `actions` queue using its own
+        browser session, sending `(action, rows)` to the `results` queue (and
+        `None` when there are no more actions to execute). Failed actions go
+        back to the end of the queue, so usually another session retries them"""
+        self.browser = browser
+        try:
+            self.start_page()
+            while True:
+                try:
+                    action, attempt = actions.get_nowait()
+                except Empty:
+                    break
+
+                result = self.execute_action(action, attempt)
+                if result is None and attempt <= self.retries:
+                    actions.put((action, attempt + 1))
+                else:
+                    results.put((action, result))
+        except Exception:  # do not let one session kill the pool
+            self.logger.exception("Worker failed")
+        finally:
+            results.put(None)
+
+    def execute_all(self, actions):
+        """Yields `(action, rows)` as each action is executed, with `None` as
+        rows for the ones that failed after all the retries"""
+        if len(self.pool) == 1:
+            self.start_page()
+            for action in actions:
+                for attempt in range(1, self.retries + 2):
+                    result = self.execute_action(action, attempt)
+                    if result is not None:
+                        break
+                yield action, result
+            return
+
+        queue, results = Queue(), Queue()
+        for action in actions:
+            queue.put((action, 1))
+
+        self.logger.info(
+            f"Executing {queue.qsize()} actions with {len(self.pool)} browsers"
+        )
+        with ThreadPoolExecutor(max_workers=len(self.pool)) as executor:
+            for browser in self.pool:
+                executor.submit(self.worker, browser, queue, results)
+
+            running = len(self.pool)
+            while running:
+                result = results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+
+        # left behind if every session failed
+        while not queue.empty():
+            action, _ = queue.get_nowait()
+            yield action, None
 
     def should_wait(self):
         return (
@@ -58,14 +148,18 @@ class BaseBudgetExecutionSpider(SeleniumSpider):
         self.wait()
 
     def close(self):
-        self.browser.quit()
+        for browser in self.pool:
+            browser.quit()
 
     def execute(self, year, action):
         raise NotImplementedError()
 
 
 class BRDecimalField(rows.fields.DecimalField):
+    # Removes thousands separators and uses "." for decimals in a single pass
+    TRANSLATION = str.maketrans({".": None, ",": "."})
+
     @classmethod
     def deserialize(self, value):
-        value = str(value or "").replace(".", "").replace(",", ".")
+        value = str(value or "").translate(self.TRANSLATION)
         return super().deserialize(value)
@@ -1,26 +1,31 @@
-import glob
 import logging
-import os
+import shutil
 import time
 from pathlib import Path
+from tempfile import mkdtemp
 
 import rows
 from selenium import webdriver
 from selenium.common.exceptions import StaleElementReferenceException
 
+from justa.downloads import DownloadWatcher
 from justa.spiders.budget_base import BaseBudgetExecutionSpider, BRDecimalField
 
 
-def wait_for(condition_function):
-    start_time = time.time()
+def wait_for(condition_function, timeout=120, interval=0.1):
+    deadline = time.time() + timeout
     while not condition_function():
-        time.sleep(0.1)
+        if time.time() > deadline:
+            raise TimeoutError(f"Condition not met after {timeout}s")
+        time.sleep(interval)
+
 
 class wait_for_page_load(object):
 
-    def __init__(self, browser, value_to_wait_for):
+    def __init__(self, browser, value_to_wait_for, timeout=120):
         self.browser = browser
         self.value_to_wait_for = value_to_wait_for
+        self.timeout = timeout
 
     def __enter__(self):
         self.old_page = self.browser.find_by_tag('html').first._element
@@ -34,12 +39,14 @@ class wait_for_page_load(object):
         return different_html and element_present
 
     def __exit__(self, *_):
-        wait_for(self.page_has_loaded)
+        wait_for(self.page_has_loaded, timeout=self.timeout)
 
 
 class CearaBudgetExecutionSpider(BaseBudgetExecutionSpider):
     browser_name = "firefox"
     download_path = Path("/mnt/data/")  # TODO: get from justa.settings?
+    download_timeout = 300  # Seconds to wait for the spreadsheet download
+    page_load_timeout = 120  # Seconds to wait for a page to reload
     name = "budget_ce"
     preferences = {
         "browser.download.folderList": 2,
@@ -54,14 +61,42 @@ class CearaBudgetExecutionSpider(BaseBudgetExecutionSpider):
     url = "http://web3.seplag.ce.gov.br/siofconsulta/Paginas/frm_consulta_execucao.aspx"
     value_to_wait_for = "Visualizar"
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self, download_timeout=None, page_load_timeout=None, *args, **kwargs
+    ):
+        # If using "scrapy crawl -a download_timeout=600" we must parse strings
+        if download_timeout is not None:
+            self.download_timeout = float(download_timeout)
+        if page_load_timeout is not None:
+            self.page_load_timeout = float(page_load_timeout)
+        self.sessions = []  # download directories created by this spider
         super().__init__(*args, **kwargs)
         if self.headless:
             raise RuntimeError(
                 "This spider cannot be run in headless mode. Check the bug: <https://bugs.chromium.org/p/chromium/issues/detail?id=696481>"
             )
-        if not self.download_path.exists():
-            self.download_path.mkdir(parents=True)
+
+    def new_browser(self):
+        """Each browser session downloads to its own directory (unique, so
+        other runs using the same data directory do not see its files)"""
+        self.download_path.mkdir(parents=True, exist_ok=True)
+        download_path = Path(mkdtemp(prefix="session-", dir=self.download_path))
+        self.sessions.append(download_path)
+        preferences = dict(
+            self.preferences,
+            **{
+                "browser.download.dir": str(download_path.absolute()),
+                "browser.download.lastDir": str(download_path.absolute()),
+            },
+        )
+        browser = super().new_browser(preferences)
+        browser.download_path = download_path
+        return browser
+
+    def close(self):
+        super().close()
+        for download_path in self.sessions:
+            shutil.rmtree(download_path, ignore_errors=True)
 
     def select_value(self, name, value, wait=True, by_text=True):
         value = str(value)
@@ -74,7 +109,7 @@ class CearaBudgetExecutionSpider(BaseBudgetExecutionSpider):
         if wait:
             # TODO: what if the value is already selected? It may be waiting
             # forever
-            with wait_for_page_load(self.browser, self.value_to_wait_for):
+            with self.page_load():
                 select = self.browser.find_by_xpath(select_xpath).first
                 getattr(select, method_name)(value)
         else:
@@ -90,7 +125,7 @@ class CearaBudgetExecutionSpider(BaseBudgetExecutionSpider):
             return
 
         if wait:
-            with wait_for_page_load(self.browser, self.value_to_wait_for):
+            with self.page_load():
                 desired_radio.check()
         else:
             desired_radio.check()
@@ -134,31 +169,22 @@ class CearaBudgetExecutionSpider(BaseBudgetExecutionSpider):
         self.select_value("Relatorio", inner_area, wait=False)
         self.radio_check("Formato", "Xlss", wait=False)  # Xlss = "Planilha"
 
-    def list_files(self):
-        return glob.glob(str(self.download_path / "*.*"))
+    def page_load(self):
+        return wait_for_page_load(
+            self.browser, self.value_to_wait_for, timeout=self.page_load_timeout
+        )
 
-    def do_search(self, sleep=0.1):
+    def do_search(self):
         logging.info(f"[Budget-CE]   Asking to generate the spreadsheet")
-        files_before = set(self.list_files())
-
-        with wait_for_page_load(self.browser, self.value_to_wait_for):
-            self.browser.find_by_value("Visualizar").first.click()
-
-        # Wait for the file to be downloaded
-        diff = set()
-        while not diff:
-            time.sleep(sleep)
-            diff = set(self.list_files()) - files_before
-            if any(filename.lower().endswith(".part") for filename in diff):
-                # ".part" extension means download didn't finished
-                diff = set()
-        assert len(diff) == 1, diff
-        filename = diff.pop()
-        filesize = 0
-        while filesize == 0:  # Wait for the file to be written by the browser
-            filesize = os.stat(filename).st_size
-            time.sleep(0.1)
-        return filename
+        watcher = DownloadWatcher(
+            self.browser.download_path,
+            patterns=("*.*",),
+            timeout=self.download_timeout,
+        )
+        with watcher:
+            with self.page_load():
+                self.browser.find_by_value("Visualizar").first.click()
+            return str(watcher.wait())
 
     def parse_budget(self, filename, year, action):
         logging.info(f"[Budget-CE]   Parsing budget {filename}")
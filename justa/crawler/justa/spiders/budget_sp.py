@@ -1,15 +1,78 @@
-import io
+from html import unescape
+from operator import attrgetter
 
 import rows
+from lxml import etree, html
 
 from justa.spiders.budget_base import BaseBudgetExecutionSpider, BRDecimalField
 
 
+MONEY_FIELDS = (
+    "dotacao_inicial",
+    "dotacao_atual",
+    "empenhado",
+    "liquidado",
+    "pago",
+    "pago_restos",
+)
+TABLE_ROWS = etree.XPath("tr | thead/tr | tbody/tr")
+ROW_CELLS = etree.XPath("td | th")
+CELL_TEXTS = etree.XPath(".//text()")
+
+
+def cell_value(cell):
+    """Same text `rows.import_from_html` extracts from a cell (which also
+    unescapes the entities left in each text)"""
+    texts = (unescape(text).strip() for text in CELL_TEXTS(cell))
+    return " ".join(text for text in texts if text)
+
+
+def table_rows(table_html, money_fields=MONEY_FIELDS):
+    """Yields the rows of a table as dicts, with the same field names
+    `rows.import_from_html` uses and the money fields parsed as Decimal. Lines
+    with a different number of cells (using colspan) are skipped"""
+    table = html.fragment_fromstring(table_html)
+    lines = [[cell_value(cell) for cell in ROW_CELLS(row)] for row in TABLE_ROWS(table)]
+    if not lines:
+        return
+
+    size = max(map(len, lines))
+    lines = [line for line in lines if len(line) == size]
+    header = rows.fields.make_header(lines[0])
+    money = [field in money_fields for field in header]
+    deserialize = BRDecimalField.deserialize
+    for line in lines[1:]:
+        yield {
+            field: deserialize(value) if is_money else value
+            for field, is_money, value in zip(header, money, line)
+        }
+
+
 class SaoPauloBudgetExecutionSpider(BaseBudgetExecutionSpider):
     name = "budget_sp"
     state = "SP"
     url = "https://www.fazenda.sp.gov.br/SigeoLei131/Paginas/FlexConsDespesa.aspx"
     value_to_wait_for = "Pesquisar"
+    result_table_xpath = "(//table)[11]"
+    unchecked_phase_xpath = (
+        "//input[@type='checkbox' and contains(@name, 'Fase') and not(@checked)]"
+    )
+
+    @property
+    def form(self):
+        """What is filled in the form of this thread's browser session, so the
+        fields already set (and their postbacks) are skipped"""
+        if not hasattr(self.local, "form"):
+            self.local.form = {}
+        return self.local.form
+
+    def start_page(self):
+        super().start_page()
+        self.form.clear()
+
+    def execute_all(self, actions):
+        # Consecutive actions of the same year keep the year and the phases
+        return super().execute_all(sorted(actions, key=attrgetter("year")))
 
     def select_year(self, year):
         select = self.browser.find_by_xpath("//select[contains(@name, 'Ano')]").first
@@ -17,17 +80,18 @@ class SaoPauloBudgetExecutionSpider(BaseBudgetExecutionSpider):
         self.wait()
 
     def check_all_phases(self):
-        finished = False
-        while not finished:
-            finished = True
-            for checkbox in self.browser.find_by_xpath(
-                "//input[@type='checkbox' and contains(@name, 'Fase')]"
-            ):
-                if not checkbox.checked:
-                    checkbox.check()
-                    self.wait()
-                    finished = False
-                    break
+        # Each check is a postback that renders the page again, so the
+        # unchecked phases are searched again (in a single query) after it.
+        # The `checked` attribute may not follow the state of the checkbox,
+        # so it is confirmed and there is at most one check per phase
+        checkboxes = self.browser.find_by_xpath(self.unchecked_phase_xpath)
+        for _ in range(len(checkboxes)):
+            checkbox = next((box for box in checkboxes if not box.checked), None)
+            if checkbox is None:
+                break
+            checkbox.check()
+            self.wait()
+            checkboxes = self.browser.find_by_xpath(self.unchecked_phase_xpath)
 
     def select_action(self, action):
         actions = self.browser.find_by_xpath(
@@ -48,36 +112,29 @@ class SaoPauloBudgetExecutionSpider(BaseBudgetExecutionSpider):
         self.wait()
 
     def parse_budget(self, year, action):
-        table = rows.import_from_html(
-            io.BytesIO(self.browser.html.encode("utf-8")),
-            index=10,
-            force_types={
-                "dotacao_inicial": BRDecimalField,
-                "dotacao_atual": BRDecimalField,
-                "empenhado": BRDecimalField,
-                "liquidado": BRDecimalField,
-                "pago": BRDecimalField,
-                "pago_restos": BRDecimalField,
-            },
-        )
-        result = []
-        for row in table:
-            if row.elemento == "TOTAL":
+        # Only the result table is read from the browser (and parsed)
+        table = self.browser.find_by_xpath(self.result_table_xpath).first
+        for row in table_rows(table._element.get_attribute("outerHTML")):
+            if row["elemento"] == "TOTAL":
                 continue
-            row = row._asdict()
             row.update({
                 "ano": year,
                 "codigo_acao": action,
                 "estado": "SP",
             })
-            result.append(row)
-
-        return rows.import_from_dicts(result)
+            yield row
 
     def execute(self, year, action):
-        self.select_year(year)
-        self.check_all_phases()
-        self.select_action(action)
+        form = self.form
+        if form.get("year") != year:
+            self.select_year(year)
+            form.clear()
+            form["year"] = year
+        if not form.get("phases"):
+            self.check_all_phases()
+            form["phases"] = True
+        if form.get("action") != action:
+            self.select_action(action)
+            form["action"] = action
         self.do_search()
-        for row in self.parse_budget(year, action):
-            yield row._asdict()
+        yield from self.parse_budget(year, action)
@@ -0,0 +1,104 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+
+import pytest
+import requests
+
+from justa.budget_actions import Action, ActionsCatalog, ActionsCatalogError
+
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'budget_actions.csv'
+
+
+class FakeSpreadsheet(BaseHTTPRequestHandler):
+    """Serves the fixture CSV with an ETag, answering conditional requests
+    with 304 (Not Modified) while `server.etag` does not change"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = FIXTURE.read_bytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpreadsheet)
+    server.etag, server.requests = '"v1"', []
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def catalog_for(server, path, **kwargs):
+    host, port = server.server_address
+    return ActionsCatalog(f'http://{host}:{port}/export', path, **kwargs)
+
+
+def test_actions_for_state(server, tmp_path):
+    catalog = catalog_for(server, tmp_path / 'actions.csv')
+    assert catalog.actions_for_state('CE') == [
+        Action(2019, 'CE', 'Ampliação da Rede de Atendimento', 12345)
+    ]
+    assert len(catalog.actions_for_state('SP')) == 3
+    assert len(server.requests) == 1  # parsed once per catalog
+
+
+def test_fresh_copy_is_used_without_requests(server, tmp_path):
+    catalog_for(server, tmp_path / 'actions.csv').load()
+    catalog = catalog_for(server, tmp_path / 'actions.csv')
+    assert len(catalog.actions_for_state('SP')) == 3
+    assert len(server.requests) == 1
+
+
+def test_stale_copy_is_revalidated(server, tmp_path):
+    path = tmp_path / 'actions.csv'
+    catalog_for(server, path).load()
+    catalog_for(server, path, ttl=0).load()
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    assert path.read_bytes() == FIXTURE.read_bytes()
+
+    server.etag = '"v2"'
+    path.write_text('ano,estado,nome_acao,codigo_acao\n')
+    catalog = catalog_for(server, path, ttl=0)
+    assert len(catalog.actions_for_state('SP')) == 3
+    assert len(server.requests) == 3
+    assert catalog.metadata()['etag'] == '"v2"'
+
+
+def test_stale_copy_is_used_if_spreadsheet_is_unreachable(server, tmp_path):
+    path = tmp_path / 'actions.csv'
+    catalog_for(server, path).load()
+    catalog = ActionsCatalog('http://127.0.0.1:1/export', path, ttl=0)
+    assert len(catalog.actions_for_state('SP')) == 3
+
+    catalog = ActionsCatalog('http://127.0.0.1:1/export', tmp_path / 'other.csv')
+    with pytest.raises(requests.RequestException):
+        catalog.load()
+
+
+def test_offline(server, tmp_path):
+    path = tmp_path / 'actions.csv'
+    with pytest.raises(ActionsCatalogError):
+        catalog_for(server, path, offline=True).load()
+
+    catalog_for(server, path).load()
+    catalog = catalog_for(server, path, ttl=0, offline=True)
+    assert len(catalog.actions_for_state('SP')) == 3
+    assert len(server.requests) == 1
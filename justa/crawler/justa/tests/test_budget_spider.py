@@ -0,0 +1,281 @@
+from collections import Counter
+from decimal import Decimal
+from io import BytesIO
+
+import rows
+
+from justa.budget_actions import Action
+from justa.spiders.budget_base import BaseBudgetExecutionSpider, BRDecimalField
+from justa.spiders.budget_ce import CearaBudgetExecutionSpider
+from justa.spiders.budget_sp import (
+    MONEY_FIELDS,
+    SaoPauloBudgetExecutionSpider,
+    table_rows
+)
+
+
+class FakeBrowser:
+
+    def __init__(self):
+        self.closed = False
+
+    def visit(self, url):
+        pass
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeBudgetSpider(BaseBudgetExecutionSpider):
+    name = 'fake_budget'
+    state = 'SP'
+    fake_actions = tuple(Action(2019, 'SP', f'Action {n}', n) for n in range(30))
+
+    @property
+    def actions(self):
+        return self.fake_actions
+
+    def new_browser(self):
+        return FakeBrowser()
+
+    def start_page(self):
+        pass
+
+    def execute(self, year, action):
+        yield {'ano': year, 'codigo_acao': action, 'browser': self.browser}
+
+
+def test_single_browser():
+    spider = FakeBudgetSpider()
+    items = tuple(spider.parse(None))
+    assert len(spider.pool) == 1
+    assert len(items) == 30
+    assert all(item['browser'] is spider.browser for item in items)
+
+
+def test_browser_pool():
+    spider = FakeBudgetSpider(browsers='4')
+    results = tuple(spider.execute_all(spider.actions))
+    assert len(spider.pool) == 4
+    assert {action for action, _ in results} == set(spider.actions)
+    for action, rows in results:
+        row, = rows
+        assert row['codigo_acao'] == action.code
+        assert row['browser'] in spider.pool
+
+
+def test_browser_pool_retries_failed_actions():
+    class FlakySpider(FakeBudgetSpider):
+        attempts = Counter()
+
+        def execute(self, year, action):
+            self.attempts[action] += 1
+            if action == 1 and self.attempts[action] == 1:
+                raise RuntimeError('Page timed out')
+            if action == 2:
+                raise RuntimeError('Action not found')
+            return super().execute(year, action)
+
+    spider = FlakySpider(browsers=3, retries=2)
+    results = dict(spider.execute_all(spider.actions))
+    assert len(results) == 30
+    assert len(results[spider.fake_actions[1]]) == 1
+    assert results[spider.fake_actions[2]] is None
+    assert spider.attempts[1] == 2
+    assert spider.attempts[2] == 3
+
+
+def test_failed_restart_does_not_end_the_crawl():
+    class BrokenPageSpider(FakeBudgetSpider):
+        def start_page(self):
+            if getattr(self, 'started', False):
+                raise RuntimeError('Browser crashed')
+            self.started = True
+
+        def execute(self, year, action):
+            if action == 1:
+                raise RuntimeError('Page timed out')
+            return super().execute(year, action)
+
+    spider = BrokenPageSpider(retries=1)
+    results = dict(spider.execute_all(spider.actions))
+    assert len(results) == 30
+    assert results[spider.fake_actions[1]] is None
+    assert len(results[spider.fake_actions[2]]) == 1
+
+
+def test_ceara_sessions_download_to_their_own_directories(tmp_path, monkeypatch):
+    class RemoteWebDriver(FakeBrowser):
+        def __init__(self, **kwargs):
+            super().__init__()
+            self.kwargs = kwargs
+
+    class FakeCearaSpider(CearaBudgetExecutionSpider):
+        download_path = tmp_path
+
+    monkeypatch.setattr('justa.spiders.RemoteWebDriver', RemoteWebDriver)
+    spider = FakeCearaSpider(browsers=2, headless=False)
+    other = FakeCearaSpider(headless=False)  # another run, same data path
+    sessions = spider.sessions + other.sessions
+    assert len(set(sessions)) == 3
+    assert all(session.parent == tmp_path for session in sessions)
+    for browser, session in zip(spider.pool, spider.sessions):
+        preferences = browser.kwargs['moz:firefoxOptions']['prefs']
+        assert preferences['browser.download.dir'] == str(session)
+        assert browser.download_path == session
+    assert spider.preferences is CearaBudgetExecutionSpider.preferences
+
+    spider.close()  # removes only its own directories
+    assert list(tmp_path.iterdir()) == other.sessions
+
+
+def test_close_quits_all_browsers():
+    spider = FakeBudgetSpider(browsers=3)
+    spider.close()
+    assert all(browser.closed for browser in spider.pool)
+
+
+class FakeSaoPauloSpider(SaoPauloBudgetExecutionSpider):
+    """Records the form interactions (each one is a postback)"""
+
+    def __init__(self, *args, **kwargs):
+        self.postbacks = []
+        super().__init__(*args, **kwargs)
+
+    def new_browser(self):
+        return FakeBrowser()
+
+    def wait(self):
+        pass
+
+    def start_page(self):
+        self.postbacks.append(('start_page',))
+        super().start_page()
+
+    def select_year(self, year):
+        self.postbacks.append(('year', year))
+
+    def check_all_phases(self):
+        self.postbacks.append(('phases',))
+
+    def select_action(self, action):
+        self.postbacks.append(('action', action))
+
+    def do_search(self):
+        if self.form['action'] == 13:
+            raise RuntimeError('Page timed out')
+
+    def parse_budget(self, year, action):
+        return ()
+
+
+def test_sao_paulo_fills_year_and_phases_once_per_year():
+    spider = FakeSaoPauloSpider(retries=0)
+    actions = [Action(2018 + n % 2, 'SP', f'Action {n}', 10 + n) for n in range(6)]
+    results = dict(spider.execute_all(actions))
+    assert len(results) == 6
+    assert results[actions[3]] is None
+    assert spider.postbacks == [
+        ('start_page',),
+        ('year', 2018), ('phases',), ('action', 10),
+        ('action', 12),
+        ('action', 14),
+        ('year', 2019), ('phases',), ('action', 11),
+        ('action', 13),
+        ('start_page',),  # after the failure the form is filled again
+        ('year', 2019), ('phases',), ('action', 15),
+    ]
+
+
+class FakeCheckbox:
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.checked = False
+
+    def check(self):
+        self.browser.postbacks += 1
+        self.checked = True
+
+
+class FakeElementList(list):
+
+    @property
+    def first(self):
+        return self[0]
+
+
+class StaleAttributeBrowser(FakeBrowser):
+    """The `checked` attribute is never rendered, so the XPath query for the
+    unchecked phases always finds all of them"""
+
+    def __init__(self):
+        super().__init__()
+        self.postbacks = 0
+        self.phases = FakeElementList(FakeCheckbox(self) for _ in range(4))
+
+    def find_by_xpath(self, xpath):
+        assert xpath == SaoPauloBudgetExecutionSpider.unchecked_phase_xpath
+        return self.phases
+
+
+def test_sao_paulo_check_all_phases_ends():
+    class PhasesSpider(SaoPauloBudgetExecutionSpider):
+        def new_browser(self):
+            return StaleAttributeBrowser()
+
+        def wait(self):
+            pass
+
+    spider = PhasesSpider()
+    spider.check_all_phases()
+    assert spider.browser.postbacks == 4
+    assert all(checkbox.checked for checkbox in spider.browser.phases)
+
+
+SAO_PAULO_TABLE = """
+<table>
+  <thead>
+    <tr><th colspan="7">Consulta de despesa</th></tr>
+    <tr>
+      <th>Elemento</th><th>Dotação Inicial</th><th>Dotação Atual</th>
+      <th>Empenhado</th><th>Liquidado</th><th>Pago</th><th>Pago Restos</th>
+    </tr>
+  </thead>
+  <tbody>
+    <tr>
+      <td><a href="#">339039 - Outros &amp;amp; Serviços</a></td><td>1.234,56</td>
+      <td>2.000,00</td><td>1.500,00</td><td>1.000,00</td><td>900,10</td><td></td>
+    </tr>
+    <tr>
+      <td>TOTAL</td><td>1.234,56</td><td>2.000,00</td><td>1.500,00</td>
+      <td>1.000,00</td><td>900,10</td><td>0,00</td>
+    </tr>
+  </tbody>
+</table>
+"""
+
+
+def test_sao_paulo_table_rows():
+    first, total = table_rows(SAO_PAULO_TABLE)
+    assert first == {
+        'elemento': '339039 - Outros & Serviços',
+        'dotacao_inicial': Decimal('1234.56'),
+        'dotacao_atual': Decimal('2000.00'),
+        'empenhado': Decimal('1500.00'),
+        'liquidado': Decimal('1000.00'),
+        'pago': Decimal('900.10'),
+        'pago_restos': None,
+    }
+    assert total['elemento'] == 'TOTAL'
+    assert total['pago_restos'] == Decimal('0.00')
+
+
+def test_sao_paulo_table_rows_as_rows_does():
+    expected = rows.import_from_html(
+        BytesIO(SAO_PAULO_TABLE.encode('utf-8')),
+        force_types={field: BRDecimalField for field in MONEY_FIELDS},
+    )
+    assert list(table_rows(SAO_PAULO_TABLE)) == [
+        row._asdict() for row in expected
+    ]
@@ -0,0 +1,160 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep, time
+from urllib.parse import parse_qs
+
+import pytest
+
+from justa.captcha import CaptchaBroker, CaptchaError
+
+
+class Fake2Captcha(BaseHTTPRequestHandler):
+    """Minimal fake of the 2captcha API: each request is solved after
+    `server.delay` seconds"""
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, request):
+        body = json.dumps({'status': status, 'request': request}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        data = {
+            key: value[0]
+            for key, value in parse_qs(self.rfile.read(length).decode()).items()
+        }
+        server = self.server
+
+        if self.path == '/in.php':
+            if server.balance <= 0:
+                return self.reply(0, 'ERROR_ZERO_BALANCE')
+            server.balance -= 1
+            request_id = str(len(server.requests) + 1)
+            server.requests[request_id] = (data['googlekey'], time())
+            return self.reply(1, request_id)
+
+        if data['action'] == 'get':
+            request_ids = data['ids'].split(',')
+            server.polls.append(request_ids)
+            results = []
+            for request_id in request_ids:
+                sitekey, requested_at = server.requests[request_id]
+                if time() - requested_at < server.delay:
+                    results.append('CAPCHA_NOT_READY')
+                else:
+                    results.append(f'token-{sitekey}-{request_id}')
+            return self.reply(1, '|'.join(results))
+
+        server.reports.append((data['action'], data['id']))
+        return self.reply(1, 'OK_REPORT_RECORDED')
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Fake2Captcha)
+    server.balance, server.delay = 100, 0.2
+    server.requests, server.polls, server.reports = {}, [], []
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def broker_for(server, **kwargs):
+    host, port = server.server_address
+    options = dict(initial_wait=0.1, poll_interval=0.05, timeout=5)
+    options.update(kwargs)
+    return CaptchaBroker('42', url=f'http://{host}:{port}/', **options)
+
+
+def test_solve(server):
+    broker = broker_for(server)
+    solution = broker.solve('sitekey', 'https://esaj.tjce.jus.br/open.do')
+    broker.close()
+    assert solution.token == f'token-sitekey-{solution.request_id}'
+
+
+def test_prefetch_and_batched_polling(server):
+    broker = broker_for(server, prefetch=3)
+    pageurl = 'https://esaj.tjce.jus.br/cposg5/search.do?numero=1'
+    broker.solve('sitekey', pageurl)
+    sleep(0.5)  # the broker keeps solutions ready for the next browsers
+    started = time()
+    broker.solve('sitekey', pageurl.replace('numero=1', 'numero=2'))
+    assert time() - started < server.delay
+    broker.close()
+
+    assert len(server.requests) >= 4
+    assert any(len(request_ids) > 1 for request_ids in server.polls)
+
+
+def test_pages_of_the_same_site_share_solutions(server):
+    broker = broker_for(server)
+    broker.solve('sitekey', 'https://esaj.tjce.jus.br/cposg5/open.do')
+    sleep(0.5)
+    started = time()
+    broker.solve('sitekey', 'https://esaj.tjce.jus.br/cposg5/search.do?numero=1')
+    assert time() - started < server.delay  # the prefetched one
+    broker.close()
+    assert list(broker.asked) == [('sitekey', 'https://esaj.tjce.jus.br')]
+
+
+def test_no_requests_while_idle(server):
+    broker = broker_for(server, ttl=0.3)
+    broker.solve('sitekey', 'https://esaj.tjce.jus.br/cposg5/open.do')
+    sleep(0.6)  # nobody asked within ttl, the prefetched solution expires
+    requested = len(server.requests)
+    sleep(1)
+    broker.close()
+    assert requested == 2  # the one solved and the one prefetched
+    assert len(server.requests) == requested
+
+
+def test_many_browsers(server):
+    broker = broker_for(server)
+    solutions = []
+    threads = [
+        Thread(target=lambda: solutions.append(broker.solve('key', 'url')))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    broker.close()
+
+    assert len(solutions) == 4
+    assert len({solution.token for solution in solutions}) == 4
+
+
+def test_expired_solutions_are_discarded(server):
+    broker = broker_for(server, prefetch=2, ttl=0.3)
+    first = broker.solve('sitekey', 'url')
+    sleep(1)
+    second = broker.solve('sitekey', 'url')
+    broker.close()
+    assert time() - second.solved_at < 0.3
+    assert second.request_id != first.request_id
+
+
+def test_report(server):
+    broker = broker_for(server)
+    broker.report('1', True)
+    broker.report('2', False)
+    broker.report(None, False)
+    assert server.reports == [('reportgood', '1'), ('reportbad', '2')]
+
+
+def test_error(server):
+    server.balance = 0
+    broker = broker_for(server)
+    with pytest.raises(CaptchaError):
+        broker.solve('sitekey', 'url')
+    broker.close()
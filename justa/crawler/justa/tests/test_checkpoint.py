@@ -0,0 +1,28 @@
+from justa.checkpoint import Checkpoint
+
+
+def test_empty_checkpoint(tmp_path):
+    checkpoint = Checkpoint(tmp_path / 'checkpoint.csv')
+    assert len(checkpoint) == 0
+    assert ('0000001-00.2018', '0000') not in checkpoint
+
+
+def test_record_and_reload(tmp_path):
+    path = tmp_path / 'checkpoint.csv'
+    checkpoint = Checkpoint(path)
+    checkpoint.record('0000001-00.2018', '0000', Checkpoint.CRAWLED)
+    checkpoint.record('0000002-00.2018', '0000', Checkpoint.FAILED)
+    assert ('0000001-00.2018', '0000') in checkpoint
+
+    checkpoint = Checkpoint(path)
+    assert len(checkpoint) == 2
+    assert ('0000001-00.2018', '0000') in checkpoint
+    assert ('0000002-00.2018', '0000') not in checkpoint  # to be retried
+
+
+def test_latest_outcome_wins(tmp_path):
+    path = tmp_path / 'checkpoint.csv'
+    checkpoint = Checkpoint(path)
+    checkpoint.record('0000001-00.2018', '0000', Checkpoint.FAILED)
+    checkpoint.record('0000001-00.2018', '0000', Checkpoint.CRAWLED)
+    assert ('0000001-00.2018', '0000') in Checkpoint(path)
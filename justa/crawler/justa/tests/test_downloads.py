@@ -0,0 +1,67 @@
+import os
+from threading import Thread
+from time import sleep, time
+
+import pytest
+
+from justa.downloads import DownloadTimeout, DownloadWatcher
+
+
+def download(path, name, delay=0.2, content=b'spreadsheet'):
+    """Mimics Firefox: an empty placeholder, then the `.part` file renamed"""
+    def target():
+        sleep(delay)
+        (path / name).touch()
+        part = path / f'{name}.part'
+        with part.open('wb') as fobj:
+            for _ in range(3):
+                fobj.write(content)
+                fobj.flush()
+                sleep(0.05)
+        os.rename(part, path / name)
+
+    thread = Thread(target=target)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize('use_inotify', (True, False))
+def test_wait(tmp_path, use_inotify):
+    (tmp_path / 'old.xls').write_bytes(b'downloaded before')
+    watcher = DownloadWatcher(
+        tmp_path, timeout=5, poll_interval=0.05, use_inotify=use_inotify
+    )
+    with watcher:
+        thread = download(tmp_path, 'report.xls')
+        filename = watcher.wait()
+    thread.join()
+    assert filename == tmp_path / 'report.xls'
+    assert filename.read_bytes() == b'spreadsheet' * 3
+
+
+def test_patterns(tmp_path):
+    with DownloadWatcher(tmp_path, patterns=('*.xls',), timeout=5) as watcher:
+        download(tmp_path, 'other.txt', delay=0).join()
+        thread = download(tmp_path, 'report.xls')
+        assert watcher.wait().name == 'report.xls'
+    thread.join()
+
+
+def test_timeout(tmp_path):
+    started = time()
+    with DownloadWatcher(tmp_path, timeout=0.3) as watcher:
+        (tmp_path / 'report.xls').touch()  # never written
+        with pytest.raises(DownloadTimeout):
+            watcher.wait()
+    assert time() - started < 2
+
+
+def test_sessions_do_not_see_each_other(tmp_path):
+    first, second = tmp_path / 'session-1', tmp_path / 'session-2'
+    with DownloadWatcher(first, timeout=5) as watcher_1, \
+            DownloadWatcher(second, timeout=5) as watcher_2:
+        threads = [download(second, 'b.xls', delay=0.1), download(first, 'a.xls')]
+        assert watcher_1.wait() == first / 'a.xls'
+        assert watcher_2.wait() == second / 'b.xls'
+    for thread in threads:
+        thread.join()
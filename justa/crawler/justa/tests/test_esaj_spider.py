@@ -0,0 +1,264 @@
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Timer
+
+import pytest
+from scrapy.http import HtmlResponse, Request, Response
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+
+from justa.spiders import ESAJSpider, visible_cells
+
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'esaj_court_order.html'
+
+
+class FakeBrowser:
+
+    def __init__(self):
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeESAJSpider(ESAJSpider):
+    name = 'fake_esaj'
+    url = 'https://esaj.tjsp.jus.br/cposg/open.do'
+    default_source = '/tmp/fake.pdf'
+    fixed_part_of_the_court_order_number = '.8.26.'
+    decision_labels = ('Decisão Monocrática', 'Despacho')
+    appeal_keywords = ('Recurso Extraordinário', 'Recurso Especial')
+    numbers = tuple((f'{n:07d}-00.2018', '0000') for n in range(42))
+
+    def new_browser(self):
+        return FakeBrowser()
+
+    def court_order(self, code, forum):
+        return {'number': code, 'browser': self.browser}
+
+
+@pytest.fixture(autouse=True)
+def reactor_calls(monkeypatch):
+    """No reactor runs in the tests, so calls to it are made right away"""
+    monkeypatch.setattr(reactor, 'callFromThread', lambda f, *args: f(*args))
+
+
+def crawl(spider):
+    """Feeds the requests of the browser engine to the spider as Scrapy
+    would, waiting for the pool to finish"""
+    court_orders = []
+    for request in spider.start_requests():
+        deferred = spider.parse(Response(request.url, request=request))
+        assert isinstance(deferred, Deferred)  # the reactor is not blocked
+        deferred.addCallback(court_orders.extend)
+    spider.executor.shutdown(wait=True)
+    return court_orders
+
+
+def test_single_browser():
+    spider = FakeESAJSpider()
+    court_orders = crawl(spider)
+    browser, = spider.pool
+    assert len(court_orders) == 42
+    assert all(item['browser'] is browser for item in court_orders)
+
+
+def test_browser_pool():
+    spider = FakeESAJSpider(browsers='4')
+    court_orders = crawl(spider)
+    assert 1 <= len(spider.pool) <= 4  # opened only when needed
+    assert len(court_orders) == 42
+    assert {item['number'] for item in court_orders} == {
+        code for code, _ in spider.numbers
+    }
+    assert all(item['browser'] in spider.pool for item in court_orders)
+
+
+def test_browser_pool_survives_errors():
+    class FailingESAJSpider(FakeESAJSpider):
+        screenshots = []
+
+        def court_order(self, code, forum):
+            if code.startswith('0000001'):
+                raise RuntimeError('Browser crashed')
+            return super().court_order(code, forum)
+
+        def error_handler(self, code, forum):
+            self.screenshots.append((code, self.browser))
+
+    spider = FailingESAJSpider(browsers=2)
+    court_orders = crawl(spider)
+    assert len(court_orders) == 41
+    (code, browser), = spider.screenshots
+    assert code == '0000001-00.2018'
+    assert browser in spider.pool
+
+
+def test_closed_cancels_pending_court_orders():
+    started, release = Event(), Event()
+
+    class SlowESAJSpider(FakeESAJSpider):
+        def court_order(self, code, forum):
+            started.set()
+            release.wait(5)
+            return super().court_order(code, forum)
+
+    spider = SlowESAJSpider()
+    court_orders = []
+    for request in list(spider.start_requests())[:3]:
+        deferred = spider.parse(Response(request.url, request=request))
+        deferred.addCallback(court_orders.extend)
+    assert started.wait(5)
+
+    Timer(0.1, release.set).start()
+    spider.closed('shutdown')  # waits only for the court order being crawled
+    assert len(court_orders) == 1
+    assert not spider.futures
+
+
+def test_closed_quits_browsers():
+    spider = FakeESAJSpider(browsers=3)
+    crawl(spider)
+    spider.closed('finished')
+    assert spider.pool
+    assert all(browser.closed for browser in spider.pool)
+
+
+def fixture_response(body=None):
+    code, forum = '2052375-28.2018', '0000'
+    request = Request(
+        'https://esaj.tjsp.jus.br/cposg/search.do',
+        meta={'code': code, 'forum': forum}
+    )
+    return HtmlResponse(
+        request.url,
+        body=body or FIXTURE.read_bytes(),
+        encoding='utf-8',
+        request=request
+    )
+
+
+def test_visible_cells():
+    cells = visible_cells(fixture_response(), ESAJSpider.expanded)
+    assert 'Fazenda Pública do Estado de São Paulo' not in cells
+    assert (
+        'Fazenda Pública do Estado de São Paulo\nAdvogado: João da Silva'
+    ) in cells
+    assert cells.count('Despacho') == 1
+    assert 'Decisão Monocrática\nVistos. Defiro o pedido de suspensão.' in cells
+
+
+def test_invalid_engine():
+    with pytest.raises(ValueError):
+        FakeESAJSpider(engine='telepathy')
+
+
+def test_http_engine_search_requests():
+    spider = FakeESAJSpider(engine='http', browsers=3)
+    assert not spider.pool  # no browser until a reCAPTCHA shows up
+    request, *_ = spider.search_requests(None)
+    assert request.url.startswith('https://esaj.tjsp.jus.br/cposg/search.do?')
+    assert 'numeroDigitoAnoUnificado=0000000-00.2018' in request.url
+    assert request.meta == {'code': '0000000-00.2018', 'forum': '0000'}
+
+
+def test_captcha_broker_only_with_recaptcha():
+    spider = FakeESAJSpider(browsers=3)
+    assert spider.captcha is None
+    spider.closed('finished')
+
+    class RecaptchaESAJSpider(FakeESAJSpider):
+        recaptcha = True
+
+    spider = RecaptchaESAJSpider(browsers=3)
+    assert spider.captcha.prefetch == 1  # not one paid solution per browser
+    spider.closed('finished')
+
+
+def test_http_engine_parse_court_order():
+    spider = FakeESAJSpider(engine='http')
+    court_order, = spider.parse_court_order(fixture_response())
+    assert court_order['number'] == '2052375-28.2018.8.26.0000'
+    assert court_order['status'] == '(Arquivado)'
+    assert court_order['category'] == 'Suspensão de Liminar'
+    assert court_order['reporter'] == 'MANOEL PEREIRA CALÇAS'
+    assert court_order['petitioner'] == 'Fazenda Pública do Estado de São Paulo'
+    assert court_order['petitioner_attorneys'] == 'João da Silva'
+    assert court_order['requested'] == 'Maria de Souza'
+    assert court_order['requested_attorneys'] == 'Ana Lima'
+    assert court_order['decision_date'] == datetime(2018, 3, 10)
+    assert court_order['decision'].startswith('Decisão Monocrática')
+    assert court_order['appeals'] == '01/02/2018\nInterposto Recurso Especial'
+
+
+def test_http_engine_falls_back_to_browser_on_recaptcha():
+    spider = FakeESAJSpider(engine='http')
+    body = b'<html><body><div class="g-recaptcha"></div></body></html>'
+    deferred = spider.parse_court_order(fixture_response(body))
+    assert isinstance(deferred, Deferred)  # the browser runs in a thread
+    spider.executor.shutdown(wait=True)
+    court_order, = deferred.result
+    assert court_order['number'] == '2052375-28.2018'
+    assert court_order['browser'] is spider.pool[0]
+
+
+def test_cells_snapshot_from_browser_html():
+    html = FIXTURE.read_text()
+    for visible, hidden in ESAJSpider.expanded.items():  # clicks on links
+        html = html.replace(f'id="{visible}" style="display: none;"', f'id="{visible}"')
+        html = html.replace(f'id="{hidden}"', f'id="{hidden}" style="display: none;"')
+
+    class SnapshotBrowser(FakeBrowser):
+        def __init__(self):
+            super().__init__()
+            self.html = html
+
+        def find_by_tag(self, tag):
+            raise AssertionError('Cells should be read from the snapshot')
+
+    class SnapshotESAJSpider(FakeESAJSpider):
+        def new_browser(self):
+            return SnapshotBrowser()
+
+    spider = SnapshotESAJSpider()
+    spider.browser = spider.new_browser()
+    cells = spider.cells()
+    assert cells == visible_cells(fixture_response(), ESAJSpider.expanded)
+
+    court_order = spider.build_court_order('2052375-28.2018', '0000', cells)
+    assert court_order['number'] == '2052375-28.2018.8.26.0000'
+    assert court_order['requested_attorneys'] == 'Ana Lima'
+
+
+def test_checkpoint_skips_crawled_court_orders(tmp_path):
+    class CheckpointESAJSpider(FakeESAJSpider):
+        default_source = str(tmp_path / 'lai.pdf')
+
+        def court_order(self, code, forum):
+            court_order = super().court_order(code, forum)
+            self.save_checkpoint(code, forum, court_order)
+            return court_order
+
+    spider = CheckpointESAJSpider(checkpoint='true')
+    first = spider.numbers[:10]
+    court_orders = [spider.court_order(code, forum) for code, forum in first]
+    assert not (tmp_path / 'fake_esaj.checkpoint.csv').exists()  # not saved
+    for court_order in court_orders:
+        spider.item_saved(court_order)  # as the pipeline does after a flush
+    assert (tmp_path / 'fake_esaj.checkpoint.csv').exists()
+
+    spider = CheckpointESAJSpider(checkpoint='true')
+    court_orders = crawl(spider)
+    assert len(court_orders) == 32
+    assert not {item['number'] for item in court_orders} & {
+        code for code, _ in first
+    }
+
+
+def test_skip_known_court_orders(monkeypatch):
+    known = {'0000000-00.2018.8.26.0000', '0000041-00.2018.8.26.0000'}
+    monkeypatch.setattr(FakeESAJSpider, 'known_numbers', known)
+    spider = FakeESAJSpider(skip_known='true')
+    court_orders = crawl(spider)
+    assert len(court_orders) == 40
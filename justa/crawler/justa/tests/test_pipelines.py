@@ -0,0 +1,147 @@
+from datetime import date
+from time import time
+
+import pytest
+from peewee import SqliteDatabase
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+
+from justa import items, models
+from justa.pipelines import JustaPipeline
+
+
+@pytest.fixture
+def database():
+    database = SqliteDatabase(':memory:')
+    tables = (models.CourtOrder, models.CourtOrderESAJ)
+    with database.bind_ctx(tables):
+        database.create_tables(tables)
+        # unique constraints are created by Django migrations
+        database.execute_sql(
+            'CREATE UNIQUE INDEX court_order_unique ON core_courtorder '
+            '(source, number, name, date, body)'
+        )
+        database.execute_sql(
+            'CREATE UNIQUE INDEX court_order_esaj_unique ON '
+            'core_courtorderesaj (source, number)'
+        )
+        yield database
+
+
+@pytest.fixture
+def spider():
+    spider = Spider(name='tjsp_full_text')
+    spider.stats = get_crawler(Spider).stats
+    return spider
+
+
+def court_order(number):
+    return items.CourtOrderESAJ(
+        number=number,
+        decision='Here comes the full text',
+        decision_date=date(2018, 1, 1),
+    )
+
+
+def test_items_are_saved_in_batches(database, spider):
+    pipeline = JustaPipeline(spider.stats, batch_size=3, flush_interval=60)
+    for number in range(4):
+        pipeline.process_item(court_order(str(number)), spider)
+    assert models.CourtOrderESAJ.select().count() == 3
+
+    pipeline.close_spider(spider)
+    assert models.CourtOrderESAJ.select().count() == 4
+    saved = models.CourtOrderESAJ.get(models.CourtOrderESAJ.number == '3')
+    assert saved.source == 'tjsp_full_text'
+    assert saved.status == ''
+
+
+def test_large_batch_within_sqlite_variables_limit(database, spider):
+    statements = []  # number of variables in each statement
+    execute_sql = database.execute_sql
+
+    def counting_execute_sql(sql, params=None, *args, **kwargs):
+        statements.append(len(params or ()))
+        return execute_sql(sql, params, *args, **kwargs)
+
+    database.execute_sql = counting_execute_sql
+    pipeline = JustaPipeline(spider.stats, batch_size=100, flush_interval=60)
+    for number in range(100):
+        pipeline.process_item(court_order(str(number)), spider)
+
+    assert models.CourtOrderESAJ.select().count() == 100
+    assert spider.stats.get_value('justa/created') == 100
+    assert max(statements) <= 999
+
+
+def test_flush_interval(database, spider):
+    pipeline = JustaPipeline(spider.stats, batch_size=100, flush_interval=0)
+    pipeline.process_item(court_order('42'), spider)
+    assert models.CourtOrderESAJ.select().count() == 1
+
+
+def test_flush_timer(database, spider, monkeypatch):
+    pipeline = JustaPipeline(spider.stats, batch_size=100, flush_interval=10)
+    pipeline.open_spider(spider)
+    assert pipeline.timer.running
+    pipeline.process_item(court_order('42'), spider)
+    pipeline.flush_old(spider)
+    assert models.CourtOrderESAJ.select().count() == 0
+
+    # no new items arrive, but the timer finds the buffer is too old
+    monkeypatch.setattr('justa.pipelines.time', lambda: time() + 10)
+    pipeline.flush_old(spider)
+    assert models.CourtOrderESAJ.select().count() == 1
+
+    pipeline.close_spider(spider)
+    assert not pipeline.timer.running
+
+
+def test_created_and_existing_stats(database, spider):
+    pipeline = JustaPipeline(spider.stats, batch_size=100, flush_interval=60)
+    for number in ('1', '2', '1'):
+        pipeline.process_item(court_order(number), spider)
+    pipeline.close_spider(spider)
+    pipeline.process_item(court_order('2'), spider)
+    pipeline.close_spider(spider)
+
+    assert models.CourtOrderESAJ.select().count() == 2
+    assert spider.stats.get_value('justa/created') == 2
+    assert spider.stats.get_value('justa/already_exists') == 2
+
+
+def test_court_orders_with_different_fields(database, spider):
+    pipeline = JustaPipeline(spider.stats, batch_size=100, flush_interval=60)
+    data = dict(number='42', name='John Doe', date=date(2018, 1, 1), text='')
+    pipeline.process_item(items.CourtOrder(**data, body='Earth'), spider)
+    pipeline.process_item(items.CourtOrder(**data), spider)
+    pipeline.close_spider(spider)
+    assert models.CourtOrder.select().count() == 2
+
+
+def test_from_crawler():
+    crawler = get_crawler(Spider, {'JUSTA_BATCH_SIZE': 42})
+    pipeline = JustaPipeline.from_crawler(crawler)
+    assert pipeline.stats is crawler.stats
+    assert pipeline.batch_size == 42
+
+
+def test_dicts_are_not_saved(database, spider):
+    pipeline = JustaPipeline(spider.stats)
+    assert pipeline.process_item({'ano': 2018}, spider) == {'ano': 2018}
+    pipeline.close_spider(spider)
+    assert models.CourtOrderESAJ.select().count() == 0
+
+
+def test_spider_is_told_about_saved_items(database, spider):
+    spider.saved = []
+    spider.item_saved = spider.saved.append
+    pipeline = JustaPipeline(spider.stats, batch_size=2, flush_interval=60)
+    first, second, third = court_order('1'), court_order('2'), court_order('1')
+    pipeline.process_item(first, spider)
+    assert spider.saved == []  # only after the flush
+    pipeline.process_item(second, spider)
+    assert spider.saved == [first, second]
+    pipeline.process_item(third, spider)
+    pipeline.close_spider(spider)
+    assert spider.saved == [first, second, third]  # already in the database